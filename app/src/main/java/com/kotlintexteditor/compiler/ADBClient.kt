@@ -1,8 +1,13 @@
 package com.kotlintexteditor.compiler
 
+import android.content.BroadcastReceiver
 import android.content.Context
+import android.content.Intent
+import android.content.IntentFilter
 import android.util.Log
+import androidx.core.content.ContextCompat
 import kotlinx.coroutines.Dispatchers
+import kotlinx.coroutines.channels.Channel
 import kotlinx.coroutines.withContext
 import kotlinx.coroutines.withTimeoutOrNull
 import kotlinx.coroutines.delay
@@ -28,6 +33,9 @@ class ADBClient(private val context: Context) {
         // File names (paths will be determined at runtime)
         private const val COMMAND_FILE_NAME = "kotlin_editor_cmd.txt"
         private const val RESPONSE_FILE_NAME = "kotlin_editor_response.json"
+        
+        // Sent by the desktop bridge (--broadcast) right after it pushes a response
+        private const val RESPONSE_READY_ACTION = "com.kotlintexteditor.RESPONSE_READY"
     }
     
     private val json = Json { 
@@ -343,6 +351,30 @@ class ADBClient(private val context: Context) {
     private suspend fun waitForResponse(timeoutMs: Long): String? {
         val startTime = System.currentTimeMillis()
         
+        // A wake-up broadcast from the bridge ends the wait between polls early
+        val wakeups = Channel<Unit>(Channel.CONFLATED)
+        val receiver = object : BroadcastReceiver() {
+            override fun onReceive(context: Context, intent: Intent) {
+                Log.d(TAG, "Response ready: ${intent.getStringArrayExtra("request_ids")?.joinToString()}")
+                wakeups.trySend(Unit)
+            }
+        }
+        // Exported, because the broadcast comes from the adb shell
+        ContextCompat.registerReceiver(
+            context,
+            receiver,
+            IntentFilter(RESPONSE_READY_ACTION),
+            ContextCompat.RECEIVER_EXPORTED
+        )
+        
+        try {
+            return pollForResponse(startTime, timeoutMs, wakeups)
+        } finally {
+            context.unregisterReceiver(receiver)
+        }
+    }
+    
+    private suspend fun pollForResponse(startTime: Long, timeoutMs: Long, wakeups: Channel<Unit>): String? {
         while (System.currentTimeMillis() - startTime < timeoutMs) {
             try {
                 // Check if response file exists
@@ -365,8 +397,8 @@ class ADBClient(private val context: Context) {
                     return response
                 }
                 
-                // Wait before next check
-                delay(POLL_INTERVAL)
+                // Wait before next check, or until the bridge says a response is ready
+                withTimeoutOrNull(POLL_INTERVAL) { wakeups.receive() }
                 
             } catch (e: Exception) {
                 Log.e(TAG, "Error waiting for response", e)
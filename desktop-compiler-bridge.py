@@ -8,7 +8,7 @@ compilation tools (kotlinc, javac). It receives source code via ADB, compiles it
 returns the results.
 
 Usage:
-    python desktop-compiler-bridge.py [--workspace PATH] [--port PORT]
+    python desktop-compiler-bridge.py [--workspace PATH] [--port PORT] [--no-daemon]
 
 Requirements:
     - Python 3.7+
@@ -18,6 +18,7 @@ Requirements:
 """
 
 import os
+import re
 import sys
 import subprocess
 import tempfile
@@ -25,10 +26,20 @@ import json
 import time
 import uuid
 import shutil
+import signal
 import argparse
+import base64
+import gzip
+import hashlib
+import queue
+import socket
+import struct
+import threading
+import zipfile
+from collections import OrderedDict, deque
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
-from dataclasses import dataclass, asdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, asdict, field, replace
 from datetime import datetime
 
 @dataclass
@@ -39,6 +50,9 @@ class CompilationRequest:
     source_code: str
     language: str  # 'kotlin' or 'java'
     timestamp: float
+    mode: str = 'compile'  # 'compile' or 'check' (diagnostics only, no artifacts)
+    device: str = ''  # Device that sent the request; newer requests supersede older ones per file
+    priority: str = 'interactive'  # 'interactive', 'run' or 'background' (preemptible)
 
 @dataclass
 class CompilationResult:
@@ -49,26 +63,1414 @@ class CompilationResult:
     stdout: str = ""
     stderr: str = ""
     compilation_time: float = 0.0
+    queue_wait_time: float = 0.0
     error_message: Optional[str] = None
+    cached: bool = False
+    cancelled: bool = False
+    diagnostics: List[dict] = field(default_factory=list)
+    exit_code: Optional[int] = None  # None when the compiler never finished
+
+# Resident Kotlin compiler. Loads K2JVMCompiler once and serves compile
+# requests read from stdin, so each compile skips JVM startup and class loading.
+#
+# Protocol (one request at a time, UTF-8 lines):
+#   bridge -> daemon:  COMPILE <token> <argc>, followed by <argc> argument lines
+#   daemon -> bridge:  compiler output lines, then "<token> EXIT <code> <used heap bytes>"
+KOTLIN_DAEMON_SOURCE = r"""
+import java.io.*;
+import java.lang.reflect.Method;
+import java.nio.charset.StandardCharsets;
+
+public class KotlinCompileServer {
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        // Keep stray prints from the compiler off the protocol channel
+        System.setOut(System.err);
+
+        Class<?> compilerClass = Class.forName("org.jetbrains.kotlin.cli.jvm.K2JVMCompiler");
+        Method exec = compilerClass.getMethod("exec", PrintStream.class, String[].class);
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocol.println("READY");
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] header = line.trim().split(" ");
+            if (header[0].equals("QUIT")) {
+                break;
+            }
+            if (!header[0].equals("COMPILE") || header.length != 3) {
+                continue;
+            }
+            String token = header[1];
+            String[] compilerArgs = new String[Integer.parseInt(header[2])];
+            for (int i = 0; i < compilerArgs.length; i++) {
+                compilerArgs[i] = in.readLine();
+            }
+
+            int code;
+            try {
+                Object compiler = compilerClass.getDeclaredConstructor().newInstance();
+                Object exitCode = exec.invoke(compiler, protocol, compilerArgs);
+                code = (Integer) exitCode.getClass().getMethod("getCode").invoke(exitCode);
+            } catch (Throwable t) {
+                t.printStackTrace(protocol);
+                code = 3;
+            }
+
+            Runtime runtime = Runtime.getRuntime();
+            protocol.flush();
+            protocol.println(token + " EXIT " + code + " " + (runtime.totalMemory() - runtime.freeMemory()));
+        }
+    }
+}
+"""
+
+# Resident javac worker speaking the same protocol. Uses the javax.tools API with
+# one StandardJavaFileManager for its whole life, so platform and classpath
+# archive indexes stay cached and javac's classes stay JIT-compiled between
+# compiles. Arguments ending in .java are compilation units, the rest are options.
+# It also accepts CHECK in place of COMPILE, which parses, attributes and
+# flow-checks the sources without generating class files.
+JAVA_DAEMON_SOURCE = r"""
+import com.sun.source.util.JavacTask;
+import java.io.*;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.List;
+import javax.tools.*;
+
+public class JavacCompileServer {
+    public static void main(String[] args) throws Exception {
+        PrintStream protocol = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        // Keep stray prints from the compiler off the protocol channel
+        System.setOut(System.err);
+
+        JavaCompiler compiler = ToolProvider.getSystemJavaCompiler();
+        if (compiler == null) {
+            System.err.println("No system Java compiler available (running on a JRE?)");
+            System.exit(2);
+        }
+        StandardJavaFileManager fileManager = compiler.getStandardFileManager(null, null, StandardCharsets.UTF_8);
+        PrintWriter diagnostics = new PrintWriter(new OutputStreamWriter(protocol, StandardCharsets.UTF_8), true);
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocol.println("READY");
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            String[] header = line.trim().split(" ");
+            if (header[0].equals("QUIT")) {
+                break;
+            }
+            boolean check = header[0].equals("CHECK");
+            if (!(check || header[0].equals("COMPILE")) || header.length != 3) {
+                continue;
+            }
+            String token = header[1];
+            int argc = Integer.parseInt(header[2]);
+            List<String> options = new ArrayList<>();
+            List<String> sources = new ArrayList<>();
+            for (int i = 0; i < argc; i++) {
+                String arg = in.readLine();
+                if (arg.endsWith(".java")) {
+                    sources.add(arg);
+                } else {
+                    options.add(arg);
+                }
+            }
+
+            int code;
+            try {
+                Iterable<? extends JavaFileObject> units = fileManager.getJavaFileObjectsFromStrings(sources);
+                if (check) {
+                    // Print diagnostics as javac would while counting errors ourselves
+                    int[] errors = {0};
+                    DiagnosticListener<JavaFileObject> listener = diagnostic -> {
+                        if (diagnostic.getKind() == Diagnostic.Kind.ERROR) {
+                            errors[0]++;
+                        }
+                        diagnostics.println(diagnostic);
+                    };
+                    JavacTask task = (JavacTask) compiler.getTask(diagnostics, fileManager, listener, options, null, units);
+                    task.analyze();
+                    code = errors[0] == 0 ? 0 : 1;
+                } else {
+                    Boolean ok = compiler.getTask(diagnostics, fileManager, null, options, null, units).call();
+                    code = Boolean.TRUE.equals(ok) ? 0 : 1;
+                }
+            } catch (Throwable t) {
+                t.printStackTrace(diagnostics);
+                code = 3;
+            }
+            diagnostics.flush();
+            fileManager.flush();
+
+            Runtime runtime = Runtime.getRuntime();
+            protocol.flush();
+            protocol.println(token + " EXIT " + code + " " + (runtime.totalMemory() - runtime.freeMemory()));
+        }
+        fileManager.close();
+    }
+}
+"""
+
+class DaemonUnavailable(Exception):
+    """Raised when a compiler daemon cannot serve a request"""
+
+class CompileCancelled(Exception):
+    """Raised when a running compile is cancelled, e.g. superseded by a newer request"""
+
+class CompilePreempted(Exception):
+    """Raised when a running compile is stopped to make room for higher-priority work"""
+
+class CancellationToken:
+    """Lets another thread cancel a compile and kill the compiler process running it"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.cancelled = False
+        self.preempted = False
+        self.reason: Optional[str] = None
+        self.kill: Optional[Callable[[], None]] = None
+
+    @property
+    def interrupted(self) -> bool:
+        """Whether the compile has been cancelled or preempted"""
+        return self.cancelled or self.preempted
+
+    @property
+    def bound(self) -> bool:
+        """Whether a compiler process is running that cancel() or preempt() can stop"""
+        with self.lock:
+            return self.kill is not None
+
+    def cancel(self, reason: str):
+        """Mark the compile cancelled and kill its process if one is running"""
+        with self.lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            self.reason = reason
+            kill = self.kill
+        self._kill(kill)
+
+    def preempt(self):
+        """Kill the running process so the compile can be retried later"""
+        with self.lock:
+            if self.interrupted:
+                return
+            self.preempted = True
+            kill = self.kill
+        self._kill(kill)
+
+    def resume(self):
+        """Clear a preemption before the compile is retried"""
+        with self.lock:
+            self.preempted = False
+
+    @staticmethod
+    def _kill(kill: Optional[Callable[[], None]]):
+        if kill is not None:
+            try:
+                kill()
+            except OSError:
+                pass
+
+    def bind(self, kill: Callable[[], None]):
+        """Register how to kill the process now running the compile"""
+        with self.lock:
+            self.kill = kill
+            interrupted = self.interrupted
+        if interrupted:
+            self._kill(kill)
+
+    def unbind(self):
+        """Forget the process once it has finished"""
+        with self.lock:
+            self.kill = None
+
+    def check(self):
+        """Raise CompileCancelled or CompilePreempted if the compile was interrupted"""
+        if self.cancelled:
+            raise CompileCancelled(self.reason)
+        if self.preempted:
+            raise CompilePreempted()
+
+class CompilerDaemon:
+    """Long-lived compiler JVM that serves compile requests over stdin/stdout"""
+
+    STARTUP_TIMEOUT = 60
+    MAX_FAILED_STARTS = 3
+    # An interrupted compile may run this long in total before the JVM is killed
+    INTERRUPT_GRACE = 5.0
+
+    def __init__(self, name: str, command: List[str], cwd: str,
+                 recycle_heap_mb: int = 768, recycle_after: int = 500):
+        self.name = name
+        self.command = command
+        self.cwd = cwd
+        self.recycle_heap_bytes = recycle_heap_mb * 1024 * 1024
+        self.recycle_after = recycle_after
+        self.process: Optional[subprocess.Popen] = None
+        self.lines: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.compile_count = 0
+        self.restarts = 0
+        self.failed_starts = 0
+        # Token of the compile in progress, for delayed kills after an interrupt
+        self.running: Optional[str] = None
+
+    @property
+    def available(self) -> bool:
+        """Whether the daemon is running or may still be (re)started"""
+        return self.failed_starts < self.MAX_FAILED_STARTS
+
+    def is_alive(self) -> bool:
+        """Check whether the daemon process is running"""
+        return self.process is not None and self.process.poll() is None
+
+    def start(self) -> bool:
+        """Start the daemon process and wait until it reports ready"""
+        with self.lock:
+            return self._start_locked()
+
+    def _start_locked(self) -> bool:
+        if self.is_alive():
+            return True
+        if not self.available:
+            return False
+
+        try:
+            self.lines = queue.Queue()
+            self.process = subprocess.Popen(
+                self.command,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                cwd=self.cwd,
+                text=True,
+                encoding='utf-8',
+                errors='replace',
+                bufsize=1
+            )
+            threading.Thread(target=self._pump_output, args=(self.process, self.lines),
+                             daemon=True).start()
+
+            # Wait for the compiler classes to load
+            line = self.lines.get(timeout=self.STARTUP_TIMEOUT)
+            if line is None or line.strip() != "READY":
+                raise DaemonUnavailable(f"unexpected startup output: {line!r}")
+
+            self.compile_count = 0
+            self.failed_starts = 0
+            print(f"[+] {self.name} daemon started (pid {self.process.pid})")
+            return True
+
+        except Exception as e:
+            self.failed_starts += 1
+            self._kill_locked()
+            print(f"[!] Could not start {self.name} daemon: {str(e)}")
+            return False
+
+    @staticmethod
+    def _pump_output(process: subprocess.Popen, lines: "queue.Queue[Optional[str]]"):
+        """Forward daemon stdout lines to a queue so reads can time out"""
+        try:
+            for line in process.stdout:
+                lines.put(line.rstrip('\r\n'))
+        except (OSError, ValueError):
+            pass
+        lines.put(None)
+
+    def compile(self, args: List[str], timeout: float, verb: str = "COMPILE",
+                on_line: Optional[Callable[[str], None]] = None,
+                cancel: Optional[CancellationToken] = None) -> Tuple[int, str]:
+        """Run one compilation and return (exit code, compiler output)
+
+        on_line, if given, is called with each output line as the compiler prints it.
+        Interrupting the token lets a short compile finish, so the JVM stays warm;
+        the caller discards the result. A compile still running INTERRUPT_GRACE
+        seconds after it started is killed with the daemon, and a fresh daemon
+        is started in the background.
+        """
+        with self.lock:
+            if not self.is_alive():
+                if self.process is not None:
+                    self.restarts += 1
+                    print(f"[!] {self.name} daemon exited, restarting")
+                if not self._start_locked():
+                    raise DaemonUnavailable(f"{self.name} daemon is not running")
+
+            token = uuid.uuid4().hex
+            try:
+                request = [f"{verb} {token} {len(args)}"] + list(args)
+                self.process.stdin.write("\n".join(request) + "\n")
+                self.process.stdin.flush()
+            except (OSError, ValueError) as e:
+                self._kill_locked()
+                raise DaemonUnavailable(f"{self.name} daemon pipe closed: {str(e)}")
+
+            output = []
+            started = time.time()
+            deadline = started + timeout
+            self.running = token
+            if cancel is not None:
+                # Compiler threads cannot be interrupted, so only a long compile is worth killing
+                process = self.process
+                cancel.bind(lambda: self._interrupt(process, token, started))
+            try:
+                while True:
+                    remaining = deadline - time.time()
+                    try:
+                        if remaining <= 0:
+                            raise queue.Empty()
+                        line = self.lines.get(timeout=remaining)
+                    except queue.Empty:
+                        # A stuck compiler cannot be interrupted, only replaced
+                        self._kill_locked()
+                        raise subprocess.TimeoutExpired(self.command, timeout)
+
+                    if line is None:
+                        self._kill_locked()
+                        if cancel is not None and cancel.interrupted:
+                            self.restarts += 1
+                            threading.Thread(target=self.start, daemon=True).start()
+                            cancel.check()
+                        raise DaemonUnavailable(f"{self.name} daemon crashed during compilation")
+                    if line.startswith(f"{token} EXIT "):
+                        _, _, code, used_heap = line.split(" ")
+                        break
+                    output.append(line)
+                    if on_line is not None and not (cancel is not None and cancel.interrupted):
+                        on_line(line)
+            finally:
+                self.running = None
+                if cancel is not None:
+                    cancel.unbind()
+
+            if cancel is not None and not cancel.cancelled:
+                # A preempted compile that finished anyway needs no retry
+                cancel.resume()
+            self.compile_count += 1
+            recycle = (int(used_heap) > self.recycle_heap_bytes
+                       or self.compile_count >= self.recycle_after)
+
+        if recycle:
+            self.recycle()
+
+        return int(code), "\n".join(output) + ("\n" if output else "")
+
+    def _interrupt(self, process: subprocess.Popen, token: str, started: float):
+        """Kill the JVM if the interrupted compile is still running after the grace period"""
+        delay = max(self.INTERRUPT_GRACE - (time.time() - started), 0)
+        timer = threading.Timer(delay, self._kill_if_running, args=(process, token))
+        timer.daemon = True
+        timer.start()
+
+    def _kill_if_running(self, process: subprocess.Popen, token: str):
+        if self.running == token and process.poll() is None:
+            print(f"[*] Killing {self.name} daemon to stop an interrupted compile")
+            process.kill()
+
+    def recycle(self):
+        """Replace the daemon process with a fresh one in the background"""
+        print(f"[*] Recycling {self.name} daemon after {self.compile_count} compiles")
+        with self.lock:
+            self._stop_locked()
+            self.restarts += 1
+        threading.Thread(target=self.start, daemon=True).start()
+
+    def stop(self):
+        """Ask the daemon to exit, killing it if it does not"""
+        with self.lock:
+            self._stop_locked()
+
+    def _stop_locked(self):
+        if not self.is_alive():
+            self.process = None
+            return
+        try:
+            self.process.stdin.write("QUIT\n")
+            self.process.stdin.flush()
+            self.process.wait(timeout=5)
+        except (OSError, ValueError, subprocess.TimeoutExpired):
+            pass
+        self._kill_locked()
+
+    def _kill_locked(self):
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+                try:
+                    self.process.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    pass
+            for stream in (self.process.stdin, self.process.stdout):
+                try:
+                    stream.close()
+                except (OSError, ValueError):
+                    pass
+        self.process = None
+
+def find_kotlin_home() -> Optional[Path]:
+    """Locate the Kotlin compiler installation (KOTLIN_HOME or kotlinc on PATH)"""
+    candidates = []
+    if os.environ.get('KOTLIN_HOME'):
+        candidates.append(Path(os.environ['KOTLIN_HOME']))
+    kotlinc = shutil.which('kotlinc')
+    if kotlinc:
+        # kotlinc lives in <home>/bin
+        candidates.append(Path(kotlinc).resolve().parent.parent)
+
+    for home in candidates:
+        if (home / 'lib' / 'kotlin-compiler.jar').exists():
+            return home
+    return None
+
+def build_daemon_classes(tools_dir: Path, class_name: str, source: str) -> Optional[Path]:
+    """Compile an embedded daemon source into tools_dir, reusing earlier builds"""
+    javac = shutil.which('javac')
+    if not javac:
+        return None
+
+    classes_dir = tools_dir / class_name
+    stamp_file = classes_dir / "source.sha256"
+    source_hash = hashlib.sha256(source.encode('utf-8')).hexdigest()
+    if stamp_file.exists() and stamp_file.read_text().strip() == source_hash:
+        return classes_dir
+
+    shutil.rmtree(classes_dir, ignore_errors=True)
+    classes_dir.mkdir(parents=True)
+    source_file = classes_dir / f"{class_name}.java"
+    source_file.write_text(source, encoding='utf-8')
+
+    result = subprocess.run(
+        [javac, '-encoding', 'UTF-8', '-d', str(classes_dir), str(source_file)],
+        capture_output=True, text=True, timeout=60
+    )
+    if result.returncode != 0:
+        print(f"[!] Could not build {class_name}: {result.stderr.strip()}")
+        return None
+
+    stamp_file.write_text(source_hash)
+    return classes_dir
+
+# kotlinc: "path/Main.kt:3:5: error: message"
+KOTLIN_DIAGNOSTIC = re.compile(r'^(?P<file>.+?):(?P<line>\d+):(?P<column>\d+): (?P<severity>error|warning|info): (?P<message>.*)$')
+# javac: "path/Main.java:3: error: message"
+JAVAC_DIAGNOSTIC = re.compile(r'^(?P<file>.+?):(?P<line>\d+): (?P<severity>error|warning): (?P<message>.*)$')
+# Either compiler, without a location: "error: message"
+GENERAL_DIAGNOSTIC = re.compile(r'^(?P<severity>error|warning|info): (?P<message>.*)$')
+# Caret line under the offending source line
+CARET_LINE = re.compile(r'^(?P<indent>\s*)\^[\^~]*\s*$')
+# Lint category or diagnostic code at the start of a message: "[deprecation] ..."
+MESSAGE_CODE = re.compile(r'^\[(?P<code>[\w.-]+)\] (?P<message>.*)$')
+# javac totals: "1 error", "2 warnings"
+SUMMARY_LINE = re.compile(r'^\d+ (errors?|warnings?)$')
+
+class DiagnosticParser:
+    """Incremental parser for kotlinc or javac output
+
+    Each record has file, line, column, severity, code and message. javac
+    reports columns only through the caret under the source line, and puts
+    extra detail such as "symbol:" and "location:" on the following indented
+    lines; that detail is appended to the message. Any other unindented line,
+    e.g. javac's closing "Note: ..." lines, ends the diagnostic. Lines are fed
+    one at a time and each diagnostic is returned as soon as it is known to be
+    complete.
+    """
+
+    def __init__(self):
+        self.current: Optional[dict] = None
+        self.continuation: List[str] = []
+        # The line after a header with a position echoes the source, indented or not
+        self.expect_source = False
+
+    def feed(self, line: str) -> List[dict]:
+        """Consume one output line and return the diagnostics it completed"""
+        completed = []
+        match = (KOTLIN_DIAGNOSTIC.match(line) or JAVAC_DIAGNOSTIC.match(line)
+                 or GENERAL_DIAGNOSTIC.match(line))
+        if match:
+            completed += self.close()
+            fields = match.groupdict()
+            message = fields['message']
+            code = None
+            code_match = MESSAGE_CODE.match(message)
+            if code_match:
+                code, message = code_match.group('code'), code_match.group('message')
+            self.current = {
+                'file': fields.get('file'),
+                'line': int(fields['line']) if fields.get('line') else None,
+                'column': int(fields['column']) if fields.get('column') else None,
+                'severity': fields['severity'],
+                'code': code,
+                'message': message
+            }
+            self.expect_source = self.current['line'] is not None
+        elif self.current is not None and SUMMARY_LINE.match(line.strip()):
+            completed += self.close()
+        elif self.current is not None:
+            caret = CARET_LINE.match(line)
+            if caret:
+                # The line above the caret is the echoed source line, not detail
+                if self.continuation:
+                    self.continuation.pop()
+                if self.current['column'] is None:
+                    self.current['column'] = len(caret.group('indent')) + 1
+                else:
+                    # kotlinc puts the column in the header and prints nothing after the caret
+                    completed += self.close()
+            elif self.expect_source or not line.strip() or line[0].isspace():
+                self.continuation.append(line)
+            else:
+                completed += self.close()
+            self.expect_source = False
+        return completed
+
+    def close(self) -> List[dict]:
+        """Finish the diagnostic in progress, if any"""
+        if self.current is None:
+            return []
+        diagnostic = self.current
+        details = [line.strip() for line in self.continuation if line.strip()]
+        if details:
+            diagnostic['message'] = "\n".join([diagnostic['message']] + details)
+        self.current = None
+        self.continuation = []
+        self.expect_source = False
+        return [diagnostic]
+
+def parse_diagnostics(output: str) -> List[dict]:
+    """Parse complete kotlinc or javac output into diagnostic records"""
+    parser = DiagnosticParser()
+    diagnostics = []
+    for line in output.splitlines():
+        diagnostics += parser.feed(line)
+    return diagnostics + parser.close()
+
+def new_process_group() -> dict:
+    """Popen arguments that start a process in its own process group"""
+    if os.name == 'nt':
+        return {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {'start_new_session': True}
+
+def kill_process_tree(process: subprocess.Popen):
+    """Kill a process started with new_process_group() and everything it started
+
+    kotlinc is a wrapper script around java; killing only the wrapper leaves
+    the compiler running with the output pipes still open.
+    """
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if process.poll() is None:
+        process.kill()
+
+def run_compiler_process(cmd: List[str], timeout: float, cwd: str,
+                         on_line: Optional[Callable[[str], None]] = None,
+                         cancel: Optional[CancellationToken] = None) -> subprocess.CompletedProcess:
+    """Run a one-shot compiler (or compiled program), passing each output line to on_line as it is printed"""
+    # Resolve the executable ourselves (kotlinc is a .bat on Windows) so no shell is needed
+    executable = shutil.which(cmd[0]) or cmd[0]
+    process = subprocess.Popen(
+        [executable] + cmd[1:],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        errors='replace',
+        cwd=cwd,
+        **new_process_group()
+    )
+
+    lines: "queue.Queue[Tuple[str, Optional[str]]]" = queue.Queue()
+
+    def pump(stream, name):
+        try:
+            for line in stream:
+                lines.put((name, line))
+        except (OSError, ValueError):
+            pass
+        lines.put((name, None))
+
+    for stream, name in ((process.stdout, 'stdout'), (process.stderr, 'stderr')):
+        threading.Thread(target=pump, args=(stream, name), daemon=True).start()
+
+    output: Dict[str, List[str]] = {'stdout': [], 'stderr': []}
+    open_streams = 2
+    deadline = time.time() + timeout
+    if cancel is not None:
+        cancel.bind(lambda: kill_process_tree(process))
+    try:
+        while open_streams:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            try:
+                name, line = lines.get(timeout=remaining)
+            except queue.Empty:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            if line is None:
+                open_streams -= 1
+                continue
+            output[name].append(line)
+            if on_line is not None:
+                on_line(line.rstrip('\r\n'))
+        returncode = process.wait(timeout=max(deadline - time.time(), 1))
+    except subprocess.TimeoutExpired:
+        kill_process_tree(process)
+        process.wait()
+        raise
+    finally:
+        if cancel is not None:
+            cancel.unbind()
+        if not open_streams:
+            # Both readers are done; after a timeout they may still be blocked in a read
+            for stream in (process.stdout, process.stderr):
+                stream.close()
+
+    if cancel is not None:
+        cancel.check()
+
+    return subprocess.CompletedProcess(cmd, returncode, ''.join(output['stdout']), ''.join(output['stderr']))
+
+def read_jar_main_class(jar_path: Path) -> Optional[str]:
+    """Read Main-Class from a jar manifest"""
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            manifest = jar.read('META-INF/MANIFEST.MF').decode('utf-8')
+    except (OSError, KeyError, zipfile.BadZipFile):
+        return None
+
+    # Manifest lines wrap at 72 bytes, continuations start with a space
+    manifest = manifest.replace('\r\n', '\n').replace('\n ', '')
+    for line in manifest.split('\n'):
+        if line.startswith('Main-Class:'):
+            return line.split(':', 1)[1].strip()
+    return None
+
+def available_memory_mb() -> Optional[int]:
+    """Best-effort amount of available physical memory in MB"""
+    try:
+        if sys.platform == 'win32':
+            import ctypes
+
+            class MemoryStatus(ctypes.Structure):
+                _fields_ = [
+                    ('dwLength', ctypes.c_ulong),
+                    ('dwMemoryLoad', ctypes.c_ulong),
+                    ('ullTotalPhys', ctypes.c_ulonglong),
+                    ('ullAvailPhys', ctypes.c_ulonglong),
+                    ('ullTotalPageFile', ctypes.c_ulonglong),
+                    ('ullAvailPageFile', ctypes.c_ulonglong),
+                    ('ullTotalVirtual', ctypes.c_ulonglong),
+                    ('ullAvailVirtual', ctypes.c_ulonglong),
+                    ('ullAvailExtendedVirtual', ctypes.c_ulonglong),
+                ]
+
+            status = MemoryStatus()
+            status.dwLength = ctypes.sizeof(MemoryStatus)
+            if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+                return status.ullAvailPhys // (1024 * 1024)
+            return None
+
+        meminfo = Path('/proc/meminfo')
+        if meminfo.exists():
+            for line in meminfo.read_text().splitlines():
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_AVPHYS_PAGES') // (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def default_worker_count(per_worker_mb: int) -> int:
+    """One worker per core, capped by how many workers fit in available memory"""
+    workers = os.cpu_count() or 1
+    memory_mb = available_memory_mb()
+    if memory_mb is not None:
+        workers = min(workers, memory_mb // per_worker_mb)
+    return max(1, workers)
+
+class DaemonPool:
+    """Fixed set of interchangeable compiler daemons, handed out one request at a time"""
+
+    def __init__(self, daemons: List[CompilerDaemon]):
+        self.daemons = daemons
+        self.idle: "queue.Queue[CompilerDaemon]" = queue.Queue()
+        for daemon in daemons:
+            self.idle.put(daemon)
+
+    @property
+    def available(self) -> bool:
+        """Whether any daemon in the pool can still serve requests"""
+        return any(daemon.available for daemon in self.daemons)
+
+    def acquire(self) -> CompilerDaemon:
+        """Take an idle daemon, waiting for one to be released if necessary"""
+        return self.idle.get()
+
+    def release(self, daemon: CompilerDaemon):
+        """Return a daemon to the pool"""
+        self.idle.put(daemon)
+
+    def stop(self):
+        """Stop every daemon in the pool"""
+        for daemon in self.daemons:
+            daemon.stop()
+
+@dataclass
+class CompileJob:
+    """A compilation request waiting for or running on a scheduler worker"""
+    request_id: str
+    enqueued_at: float
+    callback: Optional[Callable[[CompilationResult], None]] = None
+    on_diagnostic: Optional[Callable[[dict], None]] = None
+    priority: str = 'interactive'
+    result: Optional[CompilationResult] = None
+    started_at: float = 0.0
+    preemptions: int = 0
+
+    def __post_init__(self):
+        self.done = threading.Event()
+        self.reported = set()
+
+    def report(self, diagnostic: dict):
+        """Pass a diagnostic to on_diagnostic unless an earlier attempt already did
+
+        A preempted job compiles again from the start and reports the same
+        diagnostics a second time.
+        """
+        key = tuple(sorted(diagnostic.items()))
+        if key in self.reported:
+            return
+        self.reported.add(key)
+        self.on_diagnostic(diagnostic)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[CompilationResult]:
+        """Block until the job has finished and return its result"""
+        self.done.wait(timeout)
+        return self.result
+
+class CompileScheduler:
+    """Runs compile requests on a fixed number of worker threads, queueing the rest
+
+    Queued jobs run in priority order (interactive, then run, then background),
+    first come first served within a priority. A job gains one priority level
+    for every AGING_SECONDS it has waited, so background work is never starved.
+    When a higher-priority job arrives and every worker is busy, a running
+    background job is preempted: its compiler is killed and it goes back to
+    the queue, keeping its age. Only jobs with a compiler process running are
+    preempted; one waiting on a shared compile or reading the cache would not
+    free its worker. A job is preempted at most MAX_PREEMPTIONS times.
+    """
+
+    PRIORITIES = {'interactive': 0, 'run': 1, 'background': 2}
+    AGING_SECONDS = 10.0
+    MAX_PREEMPTIONS = 3
+
+    def __init__(self, bridge: "KotlinCompilerBridge", workers: int):
+        self.bridge = bridge
+        self.workers = workers
+        self.pending: List[CompileJob] = []
+        self.active: List[CompileJob] = []
+        self.lock = threading.Lock()
+        self.ready = threading.Condition(self.lock)
+        self.closing = False
+        self.running = 0
+        self.started = 0
+        self.completed = 0
+        self.preempted = 0
+        self.total_queue_wait = 0.0
+        self.max_queue_wait = 0.0
+        self.threads = [
+            threading.Thread(target=self._worker_loop, name=f"compile-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, request_id: str, callback=None, on_diagnostic=None,
+               priority: str = 'interactive') -> CompileJob:
+        """Queue a request; callback(result) is invoked on the worker thread when it finishes"""
+        job = CompileJob(request_id=request_id, enqueued_at=time.time(), callback=callback,
+                         on_diagnostic=on_diagnostic, priority=priority)
+        with self.lock:
+            self.pending.append(job)
+            victim = self._preemption_victim_locked(job)
+            self.ready.notify()
+        if victim is not None:
+            print(f"[*] Preempting {victim.priority} request {victim.request_id} for {job.request_id}")
+            self.bridge.preempt_request(victim.request_id)
+        return job
+
+    def _rank(self, job: CompileJob, now: float) -> float:
+        """Effective priority of a job, lower runs first"""
+        return self.PRIORITIES.get(job.priority, 0) - (now - job.enqueued_at) / self.AGING_SECONDS
+
+    def _preemption_victim_locked(self, job: CompileJob) -> Optional[CompileJob]:
+        """Running job to preempt so that a new job need not wait, if any"""
+        if len(self.pending) <= self.workers - self.running:
+            return None
+        now = time.time()
+        candidates = [running for running in self.active
+                      if running.priority == 'background'
+                      and self._rank(running, now) > self._rank(job, now)
+                      and running.preemptions < self.MAX_PREEMPTIONS
+                      and self.bridge.has_running_compiler(running.request_id)]
+        if not candidates:
+            return None
+        # The most recently started job has lost the least work
+        victim = max(candidates, key=lambda running: running.started_at)
+        victim.preemptions += 1
+        self.active.remove(victim)
+        return victim
+
+    def _next_job(self) -> Optional[CompileJob]:
+        """Take the highest-priority queued job, waiting for one if necessary"""
+        with self.lock:
+            while not self.pending:
+                if self.closing:
+                    return None
+                self.ready.wait()
+            now = time.time()
+            job = min(self.pending, key=lambda queued: self._rank(queued, now))
+            self.pending.remove(job)
+            job.started_at = now
+            self.active.append(job)
+            return job
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                break
+
+            queue_wait = time.time() - job.enqueued_at
+            with self.lock:
+                self.running += 1
+                self.started += 1
+                self.total_queue_wait += queue_wait
+                self.max_queue_wait = max(self.max_queue_wait, queue_wait)
+
+            try:
+                job.result = self.bridge.compile_request(
+                    job.request_id, queue_wait_time=queue_wait,
+                    on_diagnostic=job.report if job.on_diagnostic is not None else None)
+            except CompilePreempted:
+                job.result = None
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    if job in self.active:
+                        self.active.remove(job)
+                    if job.result is None:
+                        # Back in the queue with its original age, so it is not starved
+                        self.preempted += 1
+                        self.pending.append(job)
+                        self.ready.notify()
+                    else:
+                        self.completed += 1
+                if job.result is not None:
+                    job.done.set()
+
+            if job.result is not None and job.callback is not None:
+                try:
+                    job.callback(job.result)
+                except Exception as e:
+                    print(f"[!] Error in compile callback: {str(e)}")
+
+    def stats(self) -> dict:
+        """Snapshot of scheduler load and queue-wait times"""
+        with self.lock:
+            return {
+                'workers': self.workers,
+                'running': self.running,
+                'queued': len(self.pending),
+                'queued_by_priority': {
+                    priority: sum(1 for job in self.pending if job.priority == priority)
+                    for priority in self.PRIORITIES
+                },
+                'completed': self.completed,
+                'preempted': self.preempted,
+                'average_queue_wait': self.total_queue_wait / self.started if self.started else 0.0,
+                'max_queue_wait': self.max_queue_wait
+            }
+
+    def shutdown(self):
+        """Stop the worker threads once queued jobs have drained"""
+        with self.lock:
+            self.closing = True
+            self.ready.notify_all()
+
+class TimeoutModel:
+    """Timeouts learned from past durations, bucketed by kind, input size and worker warmth
+
+    The timeout for a bucket is its p99 duration times a safety factor, clamped
+    to [min_timeout, max_timeout]. Buckets with too few samples borrow the
+    samples of every size for the same kind and warmth, and fall back to the
+    default timeout until enough history exists.
+    """
+
+    SIZE_BUCKETS = [(2 * 1024, '<2KB'), (8 * 1024, '<8KB'), (32 * 1024, '<32KB')]
+    MIN_SAMPLES = 20
+    MAX_SAMPLES = 200
+
+    def __init__(self, default_timeout: float, min_timeout: float, max_timeout: float,
+                 factor: float = 3.0, history_file: Optional[Path] = None):
+        self.default_timeout = default_timeout
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.history_file = history_file
+        self.lock = threading.Lock()
+        self.history: Dict[Tuple[str, str, bool], "deque[float]"] = {}
+        self._load()
+
+    @classmethod
+    def size_bucket(cls, size: int) -> str:
+        """Label of the size bucket an input of size bytes falls into"""
+        for limit, label in cls.SIZE_BUCKETS:
+            if size < limit:
+                return label
+        return 'large'
+
+    def timeout(self, kind: str, size: int, warm: bool) -> float:
+        """Timeout for the next run of this kind"""
+        return self._decide(kind, self.size_bucket(size), warm)['timeout']
+
+    def record(self, kind: str, size: int, warm: bool, duration: float):
+        """Add the duration of a run that finished on its own"""
+        key = (kind, self.size_bucket(size), warm)
+        with self.lock:
+            self.history.setdefault(key, deque(maxlen=self.MAX_SAMPLES)).append(round(duration, 3))
+
+    def _decide(self, kind: str, bucket: str, warm: bool) -> dict:
+        with self.lock:
+            samples = list(self.history.get((kind, bucket, warm), ()))
+            source = 'bucket'
+            if len(samples) < self.MIN_SAMPLES:
+                samples = [duration for (k, _, w), durations in self.history.items()
+                           if k == kind and w == warm for duration in durations]
+                source = 'kind'
+        if len(samples) < self.MIN_SAMPLES:
+            return {'timeout': self.default_timeout, 'source': 'default', 'samples': len(samples)}
+
+        samples.sort()
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        timeout = min(max(p99 * self.factor, self.min_timeout), self.max_timeout)
+        return {'timeout': round(timeout, 1), 'source': source, 'samples': len(samples),
+                'p50': samples[len(samples) // 2], 'p99': p99}
+
+    def stats(self) -> dict:
+        """The model's settings and the timeout each known bucket currently gets"""
+        with self.lock:
+            keys = sorted(self.history)
+        return {
+            'default_timeout': self.default_timeout,
+            'min_timeout': self.min_timeout,
+            'max_timeout': self.max_timeout,
+            'factor': self.factor,
+            'buckets': [
+                {'kind': kind, 'size': bucket, 'warm': warm, **self._decide(kind, bucket, warm)}
+                for kind, bucket, warm in keys
+            ]
+        }
+
+    def _load(self):
+        if self.history_file is None or not self.history_file.exists():
+            return
+        try:
+            for entry in json.loads(self.history_file.read_text()):
+                key = (entry['kind'], entry['size'], entry['warm'])
+                self.history[key] = deque(entry['durations'], maxlen=self.MAX_SAMPLES)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[!] Ignoring unreadable timing history: {str(e)}")
+
+    def save(self):
+        """Persist the history so timeouts survive a bridge restart"""
+        if self.history_file is None:
+            return
+        with self.lock:
+            entries = [{'kind': kind, 'size': bucket, 'warm': warm, 'durations': list(durations)}
+                       for (kind, bucket, warm), durations in self.history.items()]
+        try:
+            self.history_file.write_text(json.dumps(entries))
+        except OSError as e:
+            print(f"[!] Could not save timing history: {str(e)}")
+
+class InFlightCompile:
+    """A running compile that byte-identical requests attach to instead of compiling again"""
+
+    def __init__(self, leader_id: str):
+        self.leader_id = leader_id
+        self.done = threading.Event()
+        self.result: Optional[CompilationResult] = None
+        self.lock = threading.Lock()
+        self.diagnostics: List[dict] = []
+        self.listeners: List[Callable[[dict], None]] = []
+
+    def attach(self, on_diagnostic: Optional[Callable[[dict], None]]):
+        """Follow the compile, replaying diagnostics it has already reported"""
+        if on_diagnostic is None:
+            return
+        with self.lock:
+            self.listeners.append(on_diagnostic)
+            for diagnostic in self.diagnostics:
+                self._notify(on_diagnostic, diagnostic)
+
+    def detach(self, on_diagnostic: Optional[Callable[[dict], None]]):
+        """Stop following the compile"""
+        with self.lock:
+            if on_diagnostic in self.listeners:
+                self.listeners.remove(on_diagnostic)
+
+    def publish(self, diagnostic: dict):
+        """Report a diagnostic of the running compile to every attached request"""
+        with self.lock:
+            self.diagnostics.append(diagnostic)
+            for listener in self.listeners:
+                self._notify(listener, diagnostic)
+
+    def finish(self, result: Optional[CompilationResult]):
+        """Hand the result to every waiting request"""
+        self.result = result
+        self.done.set()
+
+    @staticmethod
+    def _notify(listener: Callable[[dict], None], diagnostic: dict):
+        try:
+            listener(dict(diagnostic))
+        except Exception as e:
+            print(f"[!] Error in diagnostic callback: {str(e)}")
+
+def directory_size(path: Path) -> int:
+    """Total size in bytes of all files below path"""
+    total = 0
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    total += directory_size(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        pass
+    return total
+
+class CompileCache:
+    """Content-addressed store of compile results and artifacts with LRU eviction
+
+    Each entry lives in cache_dir/<key>/ and holds result.json plus the request's
+    artifacts directory. Entries are evicted least recently used first whenever
+    their total size grows beyond max_bytes. An entry larger than max_bytes on
+    its own is not cached at all.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # key -> entry size in bytes, least recently used first
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        existing = []
+        for entry_dir in self.cache_dir.iterdir():
+            result_file = entry_dir / "result.json"
+            if entry_dir.name.startswith('.'):
+                # Left over from an interrupted store
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            elif result_file.exists():
+                existing.append((result_file.stat().st_mtime, entry_dir.name, directory_size(entry_dir)))
+        for _, key, size in sorted(existing):
+            self.entries[key] = size
+
+    @staticmethod
+    def make_key(source_code: str, language: str, filename: str,
+                 compiler_version: str, flags: List[str]) -> str:
+        """Hash everything that can change the compiler's output"""
+        digest = hashlib.sha256()
+        for part in [language, filename, compiler_version] + list(flags):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(source_code.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[CompilationResult]:
+        """Return the cached result for key, with output_file pointing into the cache"""
+        with self.lock:
+            entry_dir = self.cache_dir / key
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            try:
+                data = json.loads((entry_dir / "result.json").read_text(encoding='utf-8'))
+                if data.get('output_file'):
+                    data['output_file'] = str(entry_dir / data['output_file'])
+                    if not Path(data['output_file']).exists():
+                        raise FileNotFoundError(data['output_file'])
+                os.utime(entry_dir / "result.json")
+            except (OSError, ValueError):
+                # Damaged entry, drop it and compile again
+                self.entries.pop(key, None)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return CompilationResult(**data)
+
+    def put(self, key: str, result: CompilationResult,
+            artifacts_dir: Path) -> Optional[CompilationResult]:
+        """Store a result, taking ownership of its artifacts directory
+
+        Returns the stored result with output_file pointing into the cache, or
+        None if nothing was stored (the key is already cached, the entry is
+        larger than the whole cache, or the store failed).
+        """
+        # Measured outside the lock; the artifacts belong to the caller until stored
+        size = directory_size(artifacts_dir)
+        if size > self.max_bytes:
+            return None
+        
+        with self.lock:
+            if key in self.entries:
+                return None
+
+            entry_dir = self.cache_dir / key
+            staging_dir = self.cache_dir / f".{key}.{uuid.uuid4().hex[:8]}"
+            try:
+                staging_dir.mkdir()
+                data = asdict(result)
+                if result.output_file:
+                    relative_output = Path(result.output_file).relative_to(artifacts_dir)
+                    data['output_file'] = str(Path("artifacts") / relative_output)
+                (staging_dir / "result.json").write_text(json.dumps(data), encoding='utf-8')
+                os.replace(artifacts_dir, staging_dir / "artifacts")
+                os.replace(staging_dir, entry_dir)
+            except (OSError, ValueError) as e:
+                print(f"[!] Could not cache result {result.id}: {str(e)}")
+                # Hand the artifacts back to the caller
+                if (staging_dir / "artifacts").exists():
+                    os.replace(staging_dir / "artifacts", artifacts_dir)
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                return None
+
+            self.entries[key] = size + (entry_dir / "result.json").stat().st_size
+            self._evict_locked(keep=key)
+
+            stored = CompilationResult(**data)
+            if stored.output_file:
+                stored.output_file = str(entry_dir / stored.output_file)
+            return stored
+
+    def _evict_locked(self, keep: str):
+        total = sum(self.entries.values())
+        while total > self.max_bytes and len(self.entries) > 1:
+            key = next(iter(self.entries))
+            if key == keep:
+                # The entry just stored is never the victim
+                self.entries.move_to_end(key)
+                continue
+            size = self.entries.pop(key)
+            shutil.rmtree(self.cache_dir / key, ignore_errors=True)
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Hit, miss and size counters"""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'bytes': sum(self.entries.values()),
+                'max_bytes': self.max_bytes
+            }
 
 class KotlinCompilerBridge:
     """Main bridge service for handling compilation requests"""
     
-    def __init__(self, workspace_dir: str):
+    # Finished results kept for get_result, oldest dropped first
+    MAX_RESULTS = 500
+    
+    def __init__(self, workspace_dir: str, use_daemon: bool = True, daemon_heap_mb: int = 1024,
+                 workers: Optional[int] = None, cache_size_mb: int = 512, thin_jars: bool = True,
+                 timeout_range: Tuple[float, float] = (10, 120),
+                 run_timeout_range: Tuple[float, float] = (30, 300),
+                 timeout_factor: float = 3.0):
         self.workspace_dir = Path(workspace_dir)
         self.temp_dir = self.workspace_dir / "temp"
         self.output_dir = self.workspace_dir / "output"
+        self.tools_dir = self.workspace_dir / "tools"
+        self.runtime_dir = self.workspace_dir / "runtime"
+        # Requests are only kept until they finish
         self.requests: Dict[str, CompilationRequest] = {}
-        self.results: Dict[str, CompilationResult] = {}
+        self.results: "OrderedDict[str, CompilationResult]" = OrderedDict()
+        self.results_lock = threading.Lock()
+        # Unfinished requests per (device, filename, mode) and the tokens that cancel them
+        self.pending_requests: Dict[Tuple[str, str, str], List[str]] = {}
+        self.cancellations: Dict[str, CancellationToken] = {}
+        self.cancellation_lock = threading.Lock()
+        self.cancelled_count = 0
+        # Running compiles by content key, so identical requests share one compiler run
+        self.in_flight: Dict[str, InFlightCompile] = {}
+        self.in_flight_lock = threading.Lock()
+        self.deduplicated_count = 0
+        self.use_daemon = use_daemon
+        self.daemon_heap_mb = daemon_heap_mb
+        self.java_heap_mb = min(daemon_heap_mb, 512)
+        self.workers = workers or default_worker_count(daemon_heap_mb + self.java_heap_mb)
+        self.kotlin_pool: Optional[DaemonPool] = None
+        self.java_pool: Optional[DaemonPool] = None
+        self.scheduler = CompileScheduler(self, self.workers)
+        self.compiler_versions: Dict[str, str] = {}
+        self.thin_jars = thin_jars
+        # Shared Kotlin stdlib that thin jars are compiled against and run with
+        self.runtime_jar: Optional[Path] = None
         
         # Create directories
         self.workspace_dir.mkdir(parents=True, exist_ok=True)
         self.temp_dir.mkdir(exist_ok=True)
         self.output_dir.mkdir(exist_ok=True)
+        self.tools_dir.mkdir(exist_ok=True)
+        
+        # Compile and run timeouts adapt to how long this machine actually takes
+        self.compile_timeouts = TimeoutModel(30, *timeout_range, factor=timeout_factor,
+                                             history_file=self.workspace_dir / "compile-timings.json")
+        self.run_timeouts = TimeoutModel(30, *run_timeout_range, factor=timeout_factor,
+                                         history_file=self.workspace_dir / "run-timings.json")
+        
+        # A cache size of 0 disables caching
+        self.cache: Optional[CompileCache] = None
+        if cache_size_mb > 0:
+            self.cache = CompileCache(self.output_dir / "cache", cache_size_mb * 1024 * 1024)
         
         print(f"[+] Workspace initialized: {self.workspace_dir}")
         print(f"[+] Temp directory: {self.temp_dir}")
         print(f"[+] Output directory: {self.output_dir}")
+        print(f"[+] Compile workers: {self.workers}")
+        if self.cache is not None:
+            print(f"[+] Compile cache: {len(self.cache.entries)} entries, {cache_size_mb} MB cap")
+
+    def prepare_runtime(self):
+        """Copy the Kotlin stdlib into the workspace so thin jars can share it"""
+        if not self.thin_jars:
+            return
+
+        kotlin_home = find_kotlin_home()
+        stdlib = kotlin_home / 'lib' / 'kotlin-stdlib.jar' if kotlin_home else None
+        if stdlib is None or not stdlib.exists():
+            print("[!] Kotlin stdlib not found, jars will include the runtime")
+            return
+
+        self.runtime_dir.mkdir(exist_ok=True)
+        runtime_jar = self.runtime_dir / 'kotlin-stdlib.jar'
+        if not runtime_jar.exists() or runtime_jar.stat().st_size != stdlib.stat().st_size:
+            shutil.copy2(stdlib, runtime_jar)
+        self.runtime_jar = runtime_jar
+        print(f"[+] Shared Kotlin runtime: {runtime_jar}")
+
+    def start_daemons(self):
+        """Start the warm compiler daemons (compiles fall back to one-shot mode without them)"""
+        if not self.use_daemon:
+            print("[*] Compiler daemons disabled, using one-shot compiles")
+            return
+
+        java = shutil.which('java')
+        if not java:
+            print("[!] Compiler daemons unavailable (java not found)")
+            return
+
+        kotlin_home = find_kotlin_home()
+        kotlin_classes = build_daemon_classes(self.tools_dir, "KotlinCompileServer", KOTLIN_DAEMON_SOURCE)
+        if kotlin_home is None or kotlin_classes is None:
+            print("[!] Kotlin daemon unavailable (Kotlin home not found or server classes not built)")
+        else:
+            compiler_jar = kotlin_home / 'lib' / 'kotlin-compiler.jar'
+            self.kotlin_pool = DaemonPool([
+                CompilerDaemon(
+                    f"Kotlin-{i + 1}",
+                    [
+                        java,
+                        f'-Xmx{self.daemon_heap_mb}m',
+                        '-Xss2m',
+                        f'-Dkotlin.home={kotlin_home}',
+                        # Keep the compiler application environment alive between compiles
+                        '-Dkotlin.environment.keepalive=true',
+                        '-cp', os.pathsep.join([str(kotlin_classes), str(compiler_jar)]),
+                        'KotlinCompileServer'
+                    ],
+                    cwd=str(self.workspace_dir),
+                    recycle_heap_mb=int(self.daemon_heap_mb * 0.75)
+                )
+                for i in range(self.workers)
+            ])
+            for daemon in self.kotlin_pool.daemons:
+                threading.Thread(
+                    target=self._warm_up_daemon,
+                    args=(daemon, "Warmup.kt", 'fun main() { println("warm") }\n'),
+                    daemon=True
+                ).start()
+
+        java_classes = build_daemon_classes(self.tools_dir, "JavacCompileServer", JAVA_DAEMON_SOURCE)
+        if java_classes is None:
+            print("[!] Java daemon unavailable (server classes not built)")
+        else:
+            self.java_pool = DaemonPool([
+                CompilerDaemon(
+                    f"Java-{i + 1}",
+                    [java, f'-Xmx{self.java_heap_mb}m', '-cp', str(java_classes), 'JavacCompileServer'],
+                    cwd=str(self.workspace_dir),
+                    recycle_heap_mb=int(self.java_heap_mb * 0.75)
+                )
+                for i in range(self.workers)
+            ])
+            for daemon in self.java_pool.daemons:
+                threading.Thread(
+                    target=self._warm_up_daemon,
+                    args=(daemon, "Warmup.java",
+                          'public class Warmup { public static void main(String[] a) {} }\n'),
+                    daemon=True
+                ).start()
+
+    def _warm_up_daemon(self, daemon: CompilerDaemon, filename: str, source: str):
+        """Start a daemon and JIT its compiler with a tiny compile"""
+        if not daemon.start():
+            return
+        warmup_dir = self.temp_dir / f"warmup-{daemon.name.lower()}"
+        warmup_dir.mkdir(exist_ok=True)
+        warmup_file = warmup_dir / filename
+        warmup_file.write_text(source, encoding='utf-8')
+        try:
+            start_time = time.time()
+            daemon.compile([str(warmup_file), '-d', str(warmup_dir / "classes")], timeout=120)
+            print(f"[+] {daemon.name} daemon warm ({time.time() - start_time:.2f}s)")
+        except (DaemonUnavailable, subprocess.TimeoutExpired) as e:
+            print(f"[!] {daemon.name} daemon warm-up failed: {str(e)}")
+        finally:
+            shutil.rmtree(warmup_dir, ignore_errors=True)
+
+    def shutdown(self):
+        """Stop the scheduler and the compiler daemons"""
+        self.scheduler.shutdown()
+        for pool in (self.kotlin_pool, self.java_pool):
+            if pool is not None:
+                pool.stop()
+        self.compile_timeouts.save()
+        self.run_timeouts.save()
 
     def check_dependencies(self) -> Tuple[bool, List[str]]:
         """Check if required tools are available"""
@@ -90,6 +1492,7 @@ class KotlinCompilerBridge:
             result = subprocess.run(['kotlinc', '-version'], 
                                   capture_output=True, text=True, timeout=10, shell=True)
             if result.returncode == 0:
+                self.compiler_versions['kotlin'] = (result.stdout + result.stderr).strip()
                 print(f"[+] Kotlin compiler: {result.stderr.strip()}")
             else:
                 issues.append("kotlinc is not working properly")
@@ -101,6 +1504,7 @@ class KotlinCompilerBridge:
             result = subprocess.run(['javac', '-version'], 
                                   capture_output=True, text=True, timeout=5, shell=True)
             if result.returncode == 0:
+                self.compiler_versions['java'] = (result.stdout + result.stderr).strip()
                 print(f"[+] Java compiler: {result.stderr.strip()}")
             else:
                 issues.append("javac is not working properly")
@@ -117,7 +1521,8 @@ class KotlinCompilerBridge:
                 device_count = len([d for d in devices if 'device' in d])
                 print(f"[+] ADB devices: {device_count} connected")
                 if device_count == 0:
-                    issues.append("No Android devices connected via ADB")
+                    # Devices are picked up whenever they are plugged in
+                    print("[!] No Android devices connected yet, waiting for one to be attached")
             else:
                 issues.append("Could not check ADB devices")
         except (subprocess.TimeoutExpired, FileNotFoundError):
@@ -125,8 +1530,13 @@ class KotlinCompilerBridge:
         
         return len(issues) == 0, issues
 
-    def create_compilation_request(self, filename: str, source_code: str) -> str:
-        """Create a new compilation request"""
+    def create_compilation_request(self, filename: str, source_code: str, mode: str = 'compile',
+                                   device: str = '', priority: Optional[str] = None) -> str:
+        """Create a new compilation request
+
+        An unfinished request for the same device, file name and mode is
+        superseded: it is cancelled and its compiler process killed.
+        """
         # Determine language from file extension
         ext = Path(filename).suffix.lower()
         if ext == '.kt':
@@ -136,6 +1546,12 @@ class KotlinCompilerBridge:
         else:
             raise ValueError(f"Unsupported file extension: {ext}")
         
+        # Explicit compiles are interactive, autosave checks run in the background
+        if priority is None:
+            priority = 'background' if mode == 'check' else 'interactive'
+        if priority not in CompileScheduler.PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority}")
+        
         # Create request
         request_id = str(uuid.uuid4())[:8]
         request = CompilationRequest(
@@ -143,88 +1559,341 @@ class KotlinCompilerBridge:
             filename=filename,
             source_code=source_code,
             language=language,
-            timestamp=time.time()
+            timestamp=time.time(),
+            mode=mode,
+            device=device,
+            priority=priority
         )
         
         self.requests[request_id] = request
-        print(f"[*] Created compilation request: {request_id} ({language})")
+        print(f"[*] Created {mode} request: {request_id} ({language}, {priority})")
+        
+        with self.cancellation_lock:
+            key = (device, filename, mode)
+            pending = self.pending_requests.setdefault(key, [])
+            # An identical retry joins the running compile instead of restarting it
+            superseded = [previous for previous in pending
+                          if self.requests[previous].source_code != source_code]
+            pending[:] = [previous for previous in pending if previous not in superseded]
+            pending.append(request_id)
+            self.cancellations[request_id] = CancellationToken()
+            tokens = [(previous, self.cancellations.get(previous)) for previous in superseded]
+        for previous, token in tokens:
+            if token is not None:
+                print(f"[*] Cancelling {previous}: superseded by {request_id}")
+                token.cancel(f"Superseded by request {request_id}")
         return request_id
 
-    def compile_request(self, request_id: str) -> CompilationResult:
-        """Compile a request and return the result"""
+    def _finish_request(self, request: CompilationRequest):
+        """Forget a request, including its source, once it has a result"""
+        with self.cancellation_lock:
+            self.requests.pop(request.id, None)
+            self.cancellations.pop(request.id, None)
+            key = (request.device, request.filename, request.mode)
+            pending = self.pending_requests.get(key, [])
+            if request.id in pending:
+                pending.remove(request.id)
+            if not pending:
+                self.pending_requests.pop(key, None)
+
+    def _cancelled_result(self, request_id: str, reason: Optional[str]) -> CompilationResult:
+        """Result reported for a request that was cancelled before it finished"""
+        with self.cancellation_lock:
+            self.cancelled_count += 1
+        print(f"[*] Compilation CANCELLED: {request_id} ({reason})")
+        return CompilationResult(
+            id=request_id,
+            success=False,
+            cancelled=True,
+            error_message=reason or "Compilation cancelled"
+        )
+
+    def submit_request(self, request_id: str,
+                       callback: Optional[Callable[[CompilationResult], None]] = None,
+                       on_diagnostic: Optional[Callable[[dict], None]] = None) -> CompileJob:
+        """Queue a request on the compile scheduler instead of compiling in the caller's thread"""
+        request = self.requests.get(request_id)
+        priority = request.priority if request is not None else 'interactive'
+        return self.scheduler.submit(request_id, callback, on_diagnostic, priority)
+
+    def has_running_compiler(self, request_id: str) -> bool:
+        """Whether a request is running a compiler process that preempt_request can stop"""
+        with self.cancellation_lock:
+            token = self.cancellations.get(request_id)
+        return token is not None and token.bound
+
+    def preempt_request(self, request_id: str):
+        """Stop a running request's compiler so the scheduler can retry it later"""
+        with self.cancellation_lock:
+            token = self.cancellations.get(request_id)
+        if token is not None:
+            token.preempt()
+
+    def compile_request(self, request_id: str, queue_wait_time: float = 0.0,
+                        on_diagnostic: Optional[Callable[[dict], None]] = None) -> CompilationResult:
+        """Compile a request and return the result
+
+        on_diagnostic, if given, is called with each diagnostic as soon as the
+        compiler has printed it, before the compile finishes.
+        """
         if request_id not in self.requests:
             return CompilationResult(
                 id=request_id,
                 success=False,
-                error_message=f"Request {request_id} not found"
+                error_message=f"Request {request_id} not found",
+                queue_wait_time=queue_wait_time
             )
         
         request = self.requests[request_id]
+        cancel = self.cancellations.get(request_id)
         start_time = time.time()
+        flight: Optional[InFlightCompile] = None
+        preempted = False
         
         try:
+            # A request superseded while it was still queued never reaches a compiler
+            if cancel is not None and cancel.cancelled:
+                result = self._cancelled_result(request_id, cancel.reason)
+                result.queue_wait_time = queue_wait_time
+                self._store_result(request_id, result)
+                return result
+            
+            # Identical sources are served from the cache without running a compiler
+            cache_key = self._cache_key(request)
+            if self.cache is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    cached.id = request_id
+                    cached.cached = True
+                    cached.compilation_time = time.time() - start_time
+                    cached.queue_wait_time = queue_wait_time
+                    self._store_result(request_id, cached)
+                    print(f"[*] Compilation CACHED: {request_id}")
+                    if on_diagnostic is not None:
+                        for diagnostic in cached.diagnostics:
+                            on_diagnostic(diagnostic)
+                    return cached
+            
+            # Identical requests already compiling share that compile instead of starting another
+            while True:
+                flight = self._join_flight(cache_key, request_id, on_diagnostic)
+                if flight.leader_id == request_id:
+                    break
+                print(f"[*] Joining in-flight compilation {flight.leader_id}: {request_id}")
+                shared = self._await_flight(flight, cancel, on_diagnostic)
+                if cancel is not None and cancel.cancelled:
+                    result = self._cancelled_result(request_id, cancel.reason)
+                elif shared is None or shared.cancelled:
+                    # The compile we joined did not finish; compile this request ourselves
+                    continue
+                else:
+                    with self.in_flight_lock:
+                        self.deduplicated_count += 1
+                    result = replace(shared, id=request_id,
+                                     diagnostics=[dict(diagnostic) for diagnostic in shared.diagnostics])
+                    print(f"[*] Compilation SHARED: {request_id} (from {flight.leader_id})")
+                result.compilation_time = time.time() - start_time
+                result.queue_wait_time = queue_wait_time
+                self._store_result(request_id, result)
+                flight = None
+                return result
+            on_diagnostic = flight.publish
+            
             print(f"[*] Starting compilation: {request_id}")
             
-            # Create temporary source file
-            temp_file = self.temp_dir / request.filename
-            temp_file.write_text(request.source_code, encoding='utf-8')
+            # Each request gets its own scratch directory so concurrent compiles never collide
+            request_dir = self.temp_dir / request_id
+            staging_dir = request_dir / "out"
+            (request_dir / "src").mkdir(parents=True)
+            staging_dir.mkdir()
             
-            # Compile based on language
-            if request.language == 'kotlin':
-                result = self._compile_kotlin(temp_file)
-            elif request.language == 'java':
-                result = self._compile_java(temp_file)
-            else:
-                result = CompilationResult(
-                    id=request_id,
-                    success=False,
-                    error_message=f"Unsupported language: {request.language}"
-                )
+            try:
+                # Create temporary source file
+                temp_file = request_dir / "src" / Path(request.filename).name
+                temp_file.write_text(request.source_code, encoding='utf-8')
+                on_line = self._diagnostic_streamer(temp_file, request.filename, on_diagnostic)
+                
+                # Compile based on language
+                try:
+                    if request.language not in ('kotlin', 'java'):
+                        result = CompilationResult(
+                            id=request_id,
+                            success=False,
+                            error_message=f"Unsupported language: {request.language}"
+                        )
+                    elif request.mode == 'check':
+                        result = self._check_source(request.language, temp_file, request_dir / "check",
+                                                    on_line, cancel)
+                    elif request.language == 'kotlin':
+                        result = self._compile_kotlin(temp_file, staging_dir, on_line, cancel)
+                    else:
+                        result = self._compile_java(temp_file, staging_dir, on_line, cancel)
+                except CompileCancelled as e:
+                    result = self._cancelled_result(request_id, str(e))
+                if cancel is not None and cancel.cancelled and not result.cancelled:
+                    # Superseded just as it finished; the stale result is still discarded
+                    result = self._cancelled_result(request_id, cancel.reason)
+                
+                if on_line is not None:
+                    on_line(None)
+                result.id = request_id
+                if not result.cancelled:
+                    # Re-parse the full output so a daemon fallback cannot leave duplicates in the result
+                    result.diagnostics = self._parse_result_diagnostics(result, temp_file, request.filename)
+                    self._promote_artifacts(result, staging_dir, cache_key)
+            finally:
+                # Clean up scratch files
+                shutil.rmtree(request_dir, ignore_errors=True)
             
             result.compilation_time = time.time() - start_time
-            self.results[request_id] = result
-            
-            # Clean up temp file
-            if temp_file.exists():
-                temp_file.unlink()
+            result.queue_wait_time = queue_wait_time
+            self._store_result(request_id, result)
             
-            status = "SUCCESS" if result.success else "FAILED"
-            print(f"[*] Compilation {status}: {request_id} ({result.compilation_time:.2f}s)")
+            if not result.cancelled:
+                status = "SUCCESS" if result.success else "FAILED"
+                print(f"[*] Compilation {status}: {request_id} ({result.compilation_time:.2f}s, "
+                      f"queued {queue_wait_time:.2f}s)")
             
             return result
             
+        except CompilePreempted:
+            # The scheduler queues the request again; it stays eligible for supersession
+            preempted = True
+            cancel.resume()
+            print(f"[*] Compilation PREEMPTED: {request_id}")
+            raise
         except Exception as e:
             result = CompilationResult(
                 id=request_id,
                 success=False,
                 error_message=str(e),
-                compilation_time=time.time() - start_time
+                compilation_time=time.time() - start_time,
+                queue_wait_time=queue_wait_time
             )
-            self.results[request_id] = result
+            self._store_result(request_id, result)
             print(f"[!] Compilation ERROR: {request_id} - {str(e)}")
             return result
+        finally:
+            if flight is not None:
+                self._land_flight(cache_key, flight, self.get_result(request_id))
+            if not preempted:
+                self._finish_request(request)
+
+    def _join_flight(self, cache_key: str, request_id: str,
+                     on_diagnostic: Optional[Callable[[dict], None]]) -> InFlightCompile:
+        """Attach to the running compile for a content key, or register this request as its leader"""
+        with self.in_flight_lock:
+            flight = self.in_flight.get(cache_key)
+            if flight is None:
+                flight = self.in_flight[cache_key] = InFlightCompile(request_id)
+        flight.attach(on_diagnostic)
+        return flight
+
+    @staticmethod
+    def _await_flight(flight: InFlightCompile, cancel: Optional[CancellationToken],
+                      on_diagnostic: Optional[Callable[[dict], None]]) -> Optional[CompilationResult]:
+        """Wait for a joined compile, giving up if this request is cancelled meanwhile"""
+        while not flight.done.wait(0.1):
+            if cancel is not None and cancel.cancelled:
+                flight.detach(on_diagnostic)
+                return None
+        return flight.result
+
+    def _land_flight(self, cache_key: str, flight: InFlightCompile, result: Optional[CompilationResult]):
+        """Release the requests waiting on a finished compile"""
+        with self.in_flight_lock:
+            if self.in_flight.get(cache_key) is flight:
+                del self.in_flight[cache_key]
+        flight.finish(result)
+
+    @staticmethod
+    def _parse_result_diagnostics(result: CompilationResult, source_file: Path, filename: str) -> List[dict]:
+        """Parse compiler output, reporting the device's file name instead of the scratch path"""
+        diagnostics = parse_diagnostics(result.stdout + result.stderr)
+        for diagnostic in diagnostics:
+            if diagnostic['file'] and Path(diagnostic['file']).name == source_file.name:
+                diagnostic['file'] = filename
+        return diagnostics
+
+    @staticmethod
+    def _diagnostic_streamer(source_file: Path, filename: str,
+                             on_diagnostic: Optional[Callable[[dict], None]]) -> Optional[Callable[[Optional[str]], None]]:
+        """Line callback that parses compiler output as it arrives and emits finished diagnostics
+
+        Calling it with None flushes the diagnostic still in progress.
+        """
+        if on_diagnostic is None:
+            return None
+        parser = DiagnosticParser()
+
+        def on_line(line: Optional[str]):
+            for diagnostic in (parser.close() if line is None else parser.feed(line)):
+                if diagnostic['file'] and Path(diagnostic['file']).name == source_file.name:
+                    diagnostic['file'] = filename
+                try:
+                    on_diagnostic(diagnostic)
+                except Exception as e:
+                    print(f"[!] Error in diagnostic callback: {str(e)}")
+
+        return on_line
+
+    def _promote_artifacts(self, result: CompilationResult, staging_dir: Path, cache_key: str):
+        """Atomically move finished artifacts out of a request's scratch directory
 
-    def _compile_kotlin(self, source_file: Path) -> CompilationResult:
-        """Compile Kotlin source file"""
-        output_file = self.output_dir / f"{source_file.stem}.jar"
+        Cacheable results move into their cache entry; anything else goes to
+        output/<request id>. Either way result.output_file is updated to match.
+        """
+        if self.cache is not None and self._is_cacheable(result):
+            stored = self.cache.put(cache_key, result, staging_dir)
+            if stored is not None:
+                result.output_file = stored.output_file
+                return
+        
+        if result.output_file:
+            final_dir = self.output_dir / result.id
+            relative_output = Path(result.output_file).relative_to(staging_dir)
+            os.replace(staging_dir, final_dir)
+            result.output_file = str(final_dir / relative_output)
+
+    def _compiler_flags(self, language: str) -> List[str]:
+        """Compiler options other than input and output paths"""
+        if language == 'kotlin':
+            if self.runtime_jar is not None:
+                # Thin jar: compile against the shared stdlib instead of bundling it
+                return ['-no-stdlib', '-classpath', str(self.runtime_jar)]
+            return ['-include-runtime']
+        return []
+
+    def _cache_key(self, request: CompilationRequest) -> str:
+        """Content key of a request: source, language, file name, compiler version and flags"""
+        return CompileCache.make_key(
+            request.source_code,
+            request.language,
+            request.filename,
+            self.compiler_versions.get(request.language, 'unknown'),
+            self._compiler_flags(request.language) + [request.mode]
+        )
+
+    @staticmethod
+    def _is_cacheable(result: CompilationResult) -> bool:
+        """Only successes and reported source errors (exit code 1) are deterministic
+
+        Timeouts, bridge errors and compiler crashes such as kotlinc's
+        INTERNAL_ERROR or a daemon running out of memory are worth retrying.
+        """
+        return result.success or result.exit_code == 1
+
+    def _compile_kotlin(self, source_file: Path, output_dir: Path,
+                        on_line: Optional[Callable[[str], None]] = None,
+                        cancel: Optional[CancellationToken] = None) -> CompilationResult:
+        """Compile Kotlin source file into a jar in output_dir"""
+        output_file = output_dir / f"{source_file.stem}.jar"
         
         try:
-            # Run kotlinc
-            cmd = [
-                'kotlinc',
-                str(source_file),
-                '-include-runtime',
-                '-d', str(output_file)
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=str(self.workspace_dir),
-                shell=True
-            )
+            # Prefer the warm daemon, fall back to a one-shot kotlinc
+            args = [str(source_file)] + self._compiler_flags('kotlin') + ['-d', str(output_file)]
+            result = self._run_compiler(self.kotlin_pool, 'kotlinc', args, 'kotlin', source_file,
+                                        on_line=on_line, cancel=cancel)
             
             if result.returncode == 0:
                 return CompilationResult(
@@ -232,7 +1901,8 @@ class KotlinCompilerBridge:
                     success=True,
                     output_file=str(output_file),
                     stdout=result.stdout,
-                    stderr=result.stderr
+                    stderr=result.stderr,
+                    exit_code=result.returncode
                 )
             else:
                 return CompilationResult(
@@ -240,14 +1910,17 @@ class KotlinCompilerBridge:
                     success=False,
                     stdout=result.stdout,
                     stderr=result.stderr,
+                    exit_code=result.returncode,
                     error_message="Kotlin compilation failed"
                 )
                 
-        except subprocess.TimeoutExpired:
+        except (CompileCancelled, CompilePreempted):
+            raise
+        except subprocess.TimeoutExpired as e:
             return CompilationResult(
                 id="",  # Will be set by caller
                 success=False,
-                error_message="Compilation timeout (30 seconds)"
+                error_message=f"Compilation timeout ({e.timeout:.0f} seconds)"
             )
         except Exception as e:
             return CompilationResult(
@@ -256,31 +1929,21 @@ class KotlinCompilerBridge:
                 error_message=f"Compilation error: {str(e)}"
             )
 
-    def _compile_java(self, source_file: Path) -> CompilationResult:
-        """Compile Java source file"""
-        output_dir = self.output_dir / "java_classes"
-        output_dir.mkdir(exist_ok=True)
+    def _compile_java(self, source_file: Path, output_dir: Path,
+                      on_line: Optional[Callable[[str], None]] = None,
+                      cancel: Optional[CancellationToken] = None) -> CompilationResult:
+        """Compile Java source file into classes in output_dir"""
         
         try:
-            # Run javac
-            cmd = [
-                'javac',
-                '-d', str(output_dir),
-                str(source_file)
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                capture_output=True,
-                text=True,
-                timeout=30,
-                cwd=str(self.workspace_dir),
-                shell=True
-            )
+            # Prefer the resident javac worker, fall back to a one-shot javac
+            args = self._compiler_flags('java') + ['-d', str(output_dir), str(source_file)]
+            result = self._run_compiler(self.java_pool, 'javac', args, 'java', source_file,
+                                        on_line=on_line, cancel=cancel)
             
             if result.returncode == 0:
-                # Find the generated class file
-                class_files = list(output_dir.glob('*.class'))
+                # Find the class generated for this source file (it may sit in a package directory)
+                class_files = (list(output_dir.rglob(f"{source_file.stem}.class"))
+                               or list(output_dir.rglob('*.class')))
                 output_file = class_files[0] if class_files else None
                 
                 return CompilationResult(
@@ -288,7 +1951,8 @@ class KotlinCompilerBridge:
                     success=True,
                     output_file=str(output_file) if output_file else str(output_dir),
                     stdout=result.stdout,
-                    stderr=result.stderr
+                    stderr=result.stderr,
+                    exit_code=result.returncode
                 )
             else:
                 return CompilationResult(
@@ -296,25 +1960,135 @@ class KotlinCompilerBridge:
                     success=False,
                     stdout=result.stdout,
                     stderr=result.stderr,
+                    exit_code=result.returncode,
                     error_message="Java compilation failed"
                 )
                 
-        except subprocess.TimeoutExpired:
+        except (CompileCancelled, CompilePreempted):
+            raise
+        except subprocess.TimeoutExpired as e:
+            return CompilationResult(
+                id="",  # Will be set by caller
+                success=False,
+                error_message=f"Compilation timeout ({e.timeout:.0f} seconds)"
+            )
+        except Exception as e:
+            return CompilationResult(
+                id="",  # Will be set by caller
+                success=False,
+                error_message=f"Compilation error: {str(e)}"
+            )
+
+    def _check_source(self, language: str, source_file: Path, scratch_dir: Path,
+                      on_line: Optional[Callable[[str], None]] = None,
+                      cancel: Optional[CancellationToken] = None) -> CompilationResult:
+        """Type-check a source file and report diagnostics without producing artifacts"""
+        label = language.capitalize()
+        scratch_dir.mkdir(parents=True, exist_ok=True)
+        
+        try:
+            if language == 'kotlin':
+                # kotlinc has no frontend-only mode; loose classes in scratch skip jar packaging
+                flags = [flag for flag in self._compiler_flags('kotlin') if flag != '-include-runtime']
+                args = [str(source_file)] + flags + ['-d', str(scratch_dir)]
+                result = self._run_compiler(self.kotlin_pool, 'kotlinc', args, 'kotlin-check', source_file,
+                                            on_line=on_line, cancel=cancel)
+            else:
+                # The javac worker analyzes without codegen; one-shot javac writes throwaway classes
+                args = self._compiler_flags('java') + ['-d', str(scratch_dir), str(source_file)]
+                result = self._run_compiler(self.java_pool, 'javac', args, 'java-check', source_file,
+                                            verb="CHECK", on_line=on_line, cancel=cancel)
+            
+            return CompilationResult(
+                id="",  # Will be set by caller
+                success=result.returncode == 0,
+                stdout=result.stdout,
+                stderr=result.stderr,
+                exit_code=result.returncode,
+                error_message=None if result.returncode == 0 else f"{label} check failed"
+            )
+            
+        except (CompileCancelled, CompilePreempted):
+            raise
+        except subprocess.TimeoutExpired as e:
             return CompilationResult(
                 id="",  # Will be set by caller
                 success=False,
-                error_message="Compilation timeout (30 seconds)"
+                error_message=f"Check timeout ({e.timeout:.0f} seconds)"
             )
         except Exception as e:
             return CompilationResult(
                 id="",  # Will be set by caller
                 success=False,
-                error_message=f"Compilation error: {str(e)}"
+                error_message=f"Check error: {str(e)}"
             )
 
+    def _run_compiler(self, pool: Optional[DaemonPool], executable: str, args: List[str],
+                      kind: str, source_file: Path, verb: str = "COMPILE",
+                      on_line: Optional[Callable[[str], None]] = None,
+                      cancel: Optional[CancellationToken] = None) -> subprocess.CompletedProcess:
+        """Run a compiler on an idle pooled daemon if available, otherwise as a one-shot process
+
+        The timeout comes from the history of compiles of the same kind, source
+        size and worker warmth, and the duration of this one is added to it.
+        """
+        size = source_file.stat().st_size
+        if pool is not None and pool.available:
+            daemon = pool.acquire()
+            try:
+                # A daemon that has compiled before has its compiler classes loaded and JIT-warmed
+                warm = daemon.is_alive() and daemon.compile_count > 0
+                timeout = self.compile_timeouts.timeout(kind, size, warm)
+                start_time = time.time()
+                exit_code, output = daemon.compile(args, timeout=timeout, verb=verb,
+                                                   on_line=on_line, cancel=cancel)
+                self.compile_timeouts.record(kind, size, warm, time.time() - start_time)
+                # Daemons report diagnostics on a single stream, as the compilers' stderr
+                return subprocess.CompletedProcess(args, exit_code, stdout="", stderr=output)
+            except DaemonUnavailable as e:
+                print(f"[!] {str(e)}, falling back to one-shot {executable}")
+            finally:
+                pool.release(daemon)
+        
+        timeout = self.compile_timeouts.timeout(kind, size, False)
+        start_time = time.time()
+        result = run_compiler_process([executable] + args, timeout, str(self.workspace_dir), on_line, cancel)
+        self.compile_timeouts.record(kind, size, False, time.time() - start_time)
+        return result
+
+    def java_command(self, jar_path: str) -> List[str]:
+        """Command that runs a compiled jar, adding the shared runtime for thin jars"""
+        main_class = read_jar_main_class(Path(jar_path))
+        if self.runtime_jar is not None and main_class:
+            classpath = os.pathsep.join([jar_path, str(self.runtime_jar)])
+            return ['java', '-cp', classpath, main_class]
+        return ['java', '-jar', jar_path]
+
     def get_result(self, request_id: str) -> Optional[CompilationResult]:
         """Get compilation result by ID"""
-        return self.results.get(request_id)
+        with self.results_lock:
+            return self.results.get(request_id)
+
+    def _store_result(self, request_id: str, result: CompilationResult):
+        """Keep a result for get_result, dropping the oldest beyond MAX_RESULTS"""
+        with self.results_lock:
+            self.results[request_id] = result
+            self.results.move_to_end(request_id)
+            while len(self.results) > self.MAX_RESULTS:
+                self.results.popitem(last=False)
+
+    def stats(self) -> dict:
+        """Bridge counters for the stats command"""
+        return {
+            'scheduler': self.scheduler.stats(),
+            'cache': self.cache.stats() if self.cache is not None else None,
+            'cancelled': self.cancelled_count,
+            'deduplicated': self.deduplicated_count,
+            'timeouts': {
+                'compile': self.compile_timeouts.stats(),
+                'run': self.run_timeouts.stats()
+            }
+        }
 
     def cleanup_old_files(self, max_age_hours: int = 24):
         """Clean up old temporary and output files"""
@@ -322,147 +2096,1332 @@ class KotlinCompilerBridge:
         max_age_seconds = max_age_hours * 3600
         
         cleaned = 0
-        for file_path in self.output_dir.glob('*'):
-            if file_path.is_file():
+        for directory in (self.output_dir, self.temp_dir):
+            for file_path in directory.glob('*'):
+                # The cache manages its own size
+                if file_path == self.output_dir / "cache":
+                    continue
                 age = current_time - file_path.stat().st_mtime
                 if age > max_age_seconds:
-                    file_path.unlink()
+                    if file_path.is_dir():
+                        shutil.rmtree(file_path, ignore_errors=True)
+                    else:
+                        file_path.unlink()
                     cleaned += 1
         
         if cleaned > 0:
             print(f"[*] Cleaned up {cleaned} old files")
 
+class AdbError(Exception):
+    """Raised when the adb server refuses a request"""
+
+class AdbConnectionLost(AdbError):
+    """Raised when the adb server closes a connection mid-request"""
+
+class AdbClient:
+    """Talks to the local adb server's host protocol directly instead of running the adb binary
+
+    Every request opens a TCP connection to the server (port 5037), selects a
+    device with host:transport and then starts a service. Shell and exec
+    services consume their connection. Sync connections (push and pull) stay
+    usable after a transfer, so a few are kept open per device and reused.
+    The adb server must already be running, e.g. after `adb devices`.
+    """
+
+    SYNC_CHUNK = 64 * 1024
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 5037, serial: Optional[str] = None,
+                 pool_size: int = 2, timeout: float = 10):
+        self.host = host
+        self.port = port
+        self.serial = serial
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sync_pool: Dict[str, List[socket.socket]] = {}
+
+    def devices(self) -> List[Tuple[str, str]]:
+        """(serial, state) of every device the adb server knows about"""
+        with self._connect() as connection:
+            self._request(connection, "host:devices")
+            length = int(self._read_exactly(connection, 4), 16)
+            listing = self._read_exactly(connection, length).decode('utf-8')
+        return [tuple(line.split('\t', 1)) for line in listing.splitlines() if '\t' in line]
+
+    def shell(self, command: str, serial: Optional[str] = None) -> bytes:
+        """Run a command through the device shell and return its output"""
+        return self._run_service(f"shell:{command}", serial)
+
+    def exec_out(self, command: str, serial: Optional[str] = None) -> bytes:
+        """Run a command without a pty and return its raw stdout (like `adb exec-out`)"""
+        return self._run_service(f"exec:{command}", serial)
+
+    def open_shell(self, command: str, serial: Optional[str] = None) -> socket.socket:
+        """Start a long-running shell command and return the connection carrying its output"""
+        connection = self._transport(serial)
+        try:
+            self._request(connection, f"shell:{command}")
+        except Exception:
+            connection.close()
+            raise
+        # The command decides when output arrives; only the caller knows how long to wait
+        connection.settimeout(None)
+        return connection
+
+    def reverse(self, device_port: int, local_port: int, serial: Optional[str] = None):
+        """Forward a TCP port on the device to a port on this machine (like `adb reverse`)"""
+        with self._transport(serial) as connection:
+            self._request(connection, f"reverse:forward:tcp:{device_port};tcp:{local_port}")
+            # The reverse service acknowledges the transport and then the forward itself
+            self._expect_okay(connection)
+
+    def push(self, local_file: Path, remote_path: str, mode: int = 0o644, serial: Optional[str] = None):
+        """Copy a local file to the device over the sync protocol"""
+        data = Path(local_file).read_bytes()
+
+        def send(connection: socket.socket):
+            self._sync_send(connection, b"SEND", f"{remote_path},{0o100000 | mode}".encode('utf-8'))
+            for offset in range(0, len(data), self.SYNC_CHUNK):
+                self._sync_send(connection, b"DATA", data[offset:offset + self.SYNC_CHUNK])
+            connection.sendall(b"DONE" + struct.pack('<I', int(time.time())))
+            status, length = self._sync_header(connection)
+            if status != b"OKAY":
+                raise AdbError(self._read_exactly(connection, length).decode('utf-8', 'replace'))
+
+        self._sync_transfer(serial, send)
+
+    def pull(self, remote_path: str, local_file: Path, serial: Optional[str] = None):
+        """Copy a file from the device over the sync protocol"""
+        def receive(connection: socket.socket) -> bytes:
+            chunks = []
+            self._sync_send(connection, b"RECV", remote_path.encode('utf-8'))
+            while True:
+                status, length = self._sync_header(connection)
+                if status == b"DATA":
+                    chunks.append(self._read_exactly(connection, length))
+                elif status == b"DONE":
+                    return b''.join(chunks)
+                else:
+                    raise AdbError(self._read_exactly(connection, length).decode('utf-8', 'replace'))
+
+        Path(local_file).write_bytes(self._sync_transfer(serial, receive))
+
+    def close(self):
+        """Close every pooled connection"""
+        with self.lock:
+            pools, self.sync_pool = self.sync_pool, {}
+        for connections in pools.values():
+            for connection in connections:
+                connection.close()
+
+    def _run_service(self, service: str, serial: Optional[str]) -> bytes:
+        with self._transport(serial) as connection:
+            self._request(connection, service)
+            chunks = []
+            while True:
+                chunk = connection.recv(self.SYNC_CHUNK)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+    def _connect(self) -> socket.socket:
+        connection = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return connection
+
+    def _transport(self, serial: Optional[str]) -> socket.socket:
+        """Connection bound to a device, ready for a service request"""
+        serial = serial or self.serial
+        connection = self._connect()
+        try:
+            self._request(connection, f"host:transport:{serial}" if serial else "host:transport-any")
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
+    def _sync_transfer(self, serial: Optional[str], transfer: Callable[[socket.socket], Any]) -> Any:
+        """Run a transfer on a pooled sync connection, retrying once on a fresh one
+
+        A pooled connection outlives an adb server restart or a USB reconnect
+        and only fails when it is next used. Its idle siblings are just as
+        stale, so they are dropped too.
+        """
+        key = serial or self.serial or ''
+        with self.lock:
+            idle = self.sync_pool.get(key)
+            connection = idle.pop() if idle else None
+        if connection is not None:
+            try:
+                with _PooledSyncConnection(self, key, connection):
+                    return transfer(connection)
+            except (OSError, AdbConnectionLost):
+                with self.lock:
+                    stale = self.sync_pool.pop(key, [])
+                for connection in stale:
+                    connection.close()
+        
+        connection = self._transport(serial)
+        try:
+            self._request(connection, "sync:")
+        except Exception:
+            connection.close()
+            raise
+        with _PooledSyncConnection(self, key, connection):
+            return transfer(connection)
+
+    def _release_sync(self, key: str, connection: socket.socket, reusable: bool):
+        with self.lock:
+            idle = self.sync_pool.setdefault(key, [])
+            if reusable and len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def _request(self, connection: socket.socket, payload: str):
+        data = payload.encode('utf-8')
+        connection.sendall(f"{len(data):04x}".encode('ascii') + data)
+        self._expect_okay(connection)
+
+    def _expect_okay(self, connection: socket.socket):
+        status = self._read_exactly(connection, 4)
+        if status == b"OKAY":
+            return
+        if status == b"FAIL":
+            length = int(self._read_exactly(connection, 4), 16)
+            raise AdbError(self._read_exactly(connection, length).decode('utf-8', 'replace'))
+        raise AdbError(f"unexpected adb server reply: {status!r}")
+
+    @staticmethod
+    def _sync_send(connection: socket.socket, request_id: bytes, data: bytes):
+        connection.sendall(request_id + struct.pack('<I', len(data)) + data)
+
+    def _sync_header(self, connection: socket.socket) -> Tuple[bytes, int]:
+        header = self._read_exactly(connection, 8)
+        return header[:4], struct.unpack('<I', header[4:])[0]
+
+    @staticmethod
+    def _read_exactly(connection: socket.socket, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise AdbConnectionLost("adb server closed the connection")
+            data += chunk
+        return data
+
+class _PooledSyncConnection:
+    """Context manager that returns a sync connection to its pool unless a transfer failed"""
+
+    def __init__(self, client: AdbClient, key: str, connection: socket.socket):
+        self.client = client
+        self.key = key
+        self.connection = connection
+
+    def __enter__(self) -> socket.socket:
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        # After an error the stream position is unknown, so the connection cannot be reused
+        self.client._release_sync(self.key, self.connection, exc_type is None)
+
+class PollBackoff:
+    """Poll interval that is short right after activity and backs off exponentially when idle"""
+
+    def __init__(self, fast_interval: float = 0.1, idle_ceiling: float = 2.0,
+                 active_window: float = 10.0, factor: float = 2.0):
+        self.fast_interval = fast_interval
+        self.idle_ceiling = max(idle_ceiling, fast_interval)
+        self.active_window = active_window
+        self.factor = factor
+        self.interval = self.idle_ceiling
+        self.last_activity = 0.0
+        self.polls = 0
+        self.active_polls = 0
+        self.hits = 0
+
+    def activity(self):
+        """Note that a command arrived; polling goes fast for the next active_window seconds"""
+        self.last_activity = time.time()
+        self.interval = self.fast_interval
+        self.hits += 1
+
+    def next_interval(self) -> float:
+        """Seconds to sleep before the next poll"""
+        self.polls += 1
+        if time.time() - self.last_activity < self.active_window:
+            self.active_polls += 1
+            self.interval = self.fast_interval
+        else:
+            self.interval = min(self.interval * self.factor, self.idle_ceiling)
+        return self.interval
+
+    def stats(self) -> dict:
+        """Current interval and poll counters"""
+        return {
+            'interval': self.interval,
+            'fast_interval': self.fast_interval,
+            'idle_ceiling': self.idle_ceiling,
+            'polls': self.polls,
+            'active_polls': self.active_polls,
+            'idle_polls': self.polls - self.active_polls,
+            'commands': self.hits
+        }
+
+class CommandFileWatcher:
+    """Long-running device shell that prints a line whenever the command file appears
+
+    The device side is a sleep/test loop, so it works on any Android shell.
+    It prints once per file and then waits for the bridge to claim the file
+    before watching for the next one. If the shell dies (device unplugged,
+    adb server restarted) it is started again.
+    """
+
+    RESTART_DELAY = 2.0
+
+    def __init__(self, adb: AdbClient, command_file_path: str, on_command: Callable[[], None],
+                 interval: float = 0.1, spool_dir: Optional[str] = None):
+        self.adb = adb
+        self.command_file_path = command_file_path
+        self.spool_dir = spool_dir
+        self.on_command = on_command
+        self.interval = interval
+        self.connection: Optional[socket.socket] = None
+        self.stopped = threading.Event()
+        self.events = 0
+
+    def start(self):
+        """Run the watch loop in the background"""
+        threading.Thread(target=self._run, name="command-watcher", daemon=True).start()
+
+    def stop(self):
+        """Stop watching and end the device shell"""
+        self.stopped.set()
+        if self.connection is not None:
+            self.connection.close()
+
+    def _script(self) -> str:
+        path = self.command_file_path
+        pending = f"[ -f {path} ]"
+        if self.spool_dir is not None:
+            pending = f"{{ {pending} || ls {self.spool_dir} 2>/dev/null | grep -qv '[.]tmp$'; }}"
+        return (f"while true; do "
+                f"if {pending}; then echo COMMAND; "
+                f"while {pending}; do sleep {self.interval}; done; fi; "
+                f"sleep {self.interval}; done")
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.connection = self.adb.open_shell(self._script())
+                print(f"[*] Watching {self.command_file_path} on device")
+                for line in self.connection.makefile('rb'):
+                    if line.strip() == b"COMMAND":
+                        self.events += 1
+                        self.on_command()
+            except (AdbError, OSError, ValueError):
+                pass
+            finally:
+                if self.connection is not None:
+                    self.connection.close()
+                    self.connection = None
+            self.stopped.wait(self.RESTART_DELAY)
+
+class DiagnosticStream:
+    """Builds the records of one streamed compile: stream_start, diagnostics, then a summary"""
+
+    def __init__(self, request_id: str, filename: str, emit: Callable[[dict], None],
+                 on_close: Optional[Callable[[], None]] = None):
+        self.request_id = request_id
+        self.emit = emit
+        self.on_close = on_close
+        self.lock = threading.Lock()
+        self.seq = 0
+        emit({'type': 'stream_start', 'id': request_id, 'filename': filename, 'timestamp': time.time()})
+
+    def diagnostic(self, diagnostic: dict):
+        """Publish one diagnostic as soon as the compiler has reported it"""
+        with self.lock:
+            self.seq += 1
+            seq = self.seq
+        self.emit({'type': 'diagnostic', 'id': self.request_id, 'seq': seq, **diagnostic})
+
+    def finish(self, result: CompilationResult):
+        """End the stream with a summary of the finished compile"""
+        severities = [diagnostic['severity'] for diagnostic in result.diagnostics]
+        self.emit({
+            'type': 'summary',
+            'id': self.request_id,
+            'success': result.success,
+            'errors': severities.count('error'),
+            'warnings': severities.count('warning'),
+            'compilation_time': result.compilation_time,
+            'cached': result.cached,
+            'cancelled': result.cancelled,
+            'output_file': result.output_file,
+            'error_message': result.error_message
+        })
+        if self.on_close is not None:
+            self.on_close()
+
+class DiagnosticStreamPublisher:
+    """Mirrors streamed diagnostic records to a JSON-lines file on the device
+
+    Records are appended locally and the whole file is pushed from a
+    background thread. Pushes are coalesced, so a burst of diagnostics costs
+    one adb push rather than one per line. The file is started afresh when a
+    stream begins and no other stream is in progress.
+    """
+
+    def __init__(self, local_file: Path, push: Callable[[Path, str], None]):
+        self.local_file = local_file
+        self.push = push
+        self.lock = threading.Lock()
+        self.lines: List[str] = []
+        self.active = 0
+        self.dirty: Dict[str, bool] = {}
+        self.pushing = False
+
+    def open(self, request_id: str, filename: str, remote_path: str) -> DiagnosticStream:
+        """Begin a stream for a request"""
+        with self.lock:
+            if self.active == 0:
+                self.lines = []
+            self.active += 1
+        return DiagnosticStream(request_id, filename,
+                                lambda record: self._append(remote_path, record), self._close)
+
+    def _close(self):
+        with self.lock:
+            self.active = max(self.active - 1, 0)
+
+    def _append(self, remote_path: str, record: dict):
+        with self.lock:
+            self.lines.append(json.dumps(record) + "\n")
+            self.dirty[remote_path] = True
+            if self.pushing:
+                return
+            self.pushing = True
+        threading.Thread(target=self._push_loop, name="diagnostic-stream", daemon=True).start()
+
+    def _push_loop(self):
+        while True:
+            with self.lock:
+                if not self.dirty:
+                    self.pushing = False
+                    return
+                remote_path = next(iter(self.dirty))
+                del self.dirty[remote_path]
+                content = ''.join(self.lines)
+            try:
+                self.local_file.write_text(content, encoding='utf-8')
+                self.push(self.local_file, remote_path)
+            except Exception as e:
+                print(f"[!] Error pushing diagnostic stream: {str(e)}")
+
+class WakeupBroadcaster:
+    """Tells the app that responses are ready with `am broadcast`, so it need not poll for them
+
+    Ids that become ready while a broadcast is being sent are collected and
+    delivered together in the next one, so a burst of responses costs one
+    broadcast rather than one each.
+    """
+
+    ACTION = "com.kotlintexteditor.RESPONSE_READY"
+    PACKAGE = "com.kotlintexteditor"
+
+    def __init__(self, adb: AdbClient):
+        self.adb = adb
+        self.lock = threading.Lock()
+        self.pending: List[str] = []
+        self.sending = False
+        self.broadcasts = 0
+
+    def notify(self, request_id: str):
+        """Queue a wake-up for a response that has been pushed"""
+        with self.lock:
+            self.pending.append(request_id)
+            if self.sending:
+                return
+            self.sending = True
+        threading.Thread(target=self._send_loop, name="wakeup-broadcast", daemon=True).start()
+
+    def _send_loop(self):
+        while True:
+            with self.lock:
+                if not self.pending:
+                    self.sending = False
+                    return
+                request_ids, self.pending = self.pending, []
+            try:
+                self.adb.shell(f"am broadcast -a {self.ACTION} -p {self.PACKAGE} "
+                               f"--esa request_ids {','.join(request_ids)}")
+                self.broadcasts += 1
+            except Exception as e:
+                print(f"[!] Error sending wake-up broadcast: {str(e)}")
+
+# Payload fields that may be large enough to be worth compressing
+COMPRESSIBLE_FIELDS = ('source_code', 'stdout', 'stderr')
+COMPRESSION_THRESHOLD = 4096
+SUPPORTED_COMPRESSION = ['gzip']
+
+def compress_fields(data: dict, threshold: int = COMPRESSION_THRESHOLD, binary: bool = False) -> dict:
+    """Replace large text fields with compressed envelopes
+
+    A compressed field becomes {"encoding": "gzip+base64", "data": ..., "length": ...}.
+    With binary framing the envelope is {"encoding": "gzip", ...} and data holds
+    the raw gzip bytes. Fields under the threshold, or that do not shrink, are
+    left as plain strings.
+    """
+    encoded = dict(data)
+    for name in COMPRESSIBLE_FIELDS:
+        value = data.get(name)
+        if not isinstance(value, str) or len(value) < threshold:
+            continue
+        raw = value.encode('utf-8')
+        packed = gzip.compress(raw, compresslevel=6)
+        if binary:
+            envelope = {'encoding': 'gzip', 'data': packed, 'length': len(raw)}
+        else:
+            packed = base64.b64encode(packed).decode('ascii')
+            envelope = {'encoding': 'gzip+base64', 'data': packed, 'length': len(raw)}
+        if len(packed) < len(raw):
+            encoded[name] = envelope
+    return encoded
+
+def decompress_fields(data: dict) -> dict:
+    """Undo compress_fields, so handlers always see plain strings
+
+    Fields sent as raw UTF-8 byte strings in binary frames are decoded too.
+    """
+    decoded = dict(data)
+    for name in COMPRESSIBLE_FIELDS:
+        value = data.get(name)
+        if isinstance(value, bytes):
+            decoded[name] = value.decode('utf-8')
+            continue
+        if not isinstance(value, dict):
+            continue
+        encoding = value.get('encoding')
+        if encoding == 'gzip+base64':
+            decoded[name] = gzip.decompress(base64.b64decode(value.get('data', ''))).decode('utf-8')
+        elif encoding == 'gzip':
+            decoded[name] = gzip.decompress(value.get('data', b'')).decode('utf-8')
+        else:
+            raise ValueError(f"Unsupported encoding for {name}: {encoding}")
+    return decoded
+
+def _cbor_head(major: int, value: int) -> bytes:
+    if value < 24:
+        return bytes([major << 5 | value])
+    if value < 0x100:
+        return bytes([major << 5 | 24, value])
+    if value < 0x10000:
+        return bytes([major << 5 | 25]) + struct.pack('>H', value)
+    if value < 0x100000000:
+        return bytes([major << 5 | 26]) + struct.pack('>I', value)
+    if value < 0x10000000000000000:
+        return bytes([major << 5 | 27]) + struct.pack('>Q', value)
+    raise ValueError(f"Integer too large for CBOR: {value}")
+
+def cbor_dumps(value) -> bytes:
+    """Encode a JSON-like value, plus bytes, as CBOR (RFC 8949)"""
+    parts: List[bytes] = []
+    _cbor_encode(value, parts)
+    return b''.join(parts)
+
+def _cbor_encode(value, parts: List[bytes]):
+    if value is None:
+        parts.append(b'\xf6')
+    elif value is True:
+        parts.append(b'\xf5')
+    elif value is False:
+        parts.append(b'\xf4')
+    elif isinstance(value, int):
+        parts.append(_cbor_head(0, value) if value >= 0 else _cbor_head(1, -1 - value))
+    elif isinstance(value, float):
+        parts.append(b'\xfb' + struct.pack('>d', value))
+    elif isinstance(value, str):
+        encoded = value.encode('utf-8')
+        parts.append(_cbor_head(3, len(encoded)))
+        parts.append(encoded)
+    elif isinstance(value, (bytes, bytearray)):
+        parts.append(_cbor_head(2, len(value)))
+        parts.append(bytes(value))
+    elif isinstance(value, (list, tuple)):
+        parts.append(_cbor_head(4, len(value)))
+        for item in value:
+            _cbor_encode(item, parts)
+    elif isinstance(value, dict):
+        parts.append(_cbor_head(5, len(value)))
+        for key, item in value.items():
+            _cbor_encode(key, parts)
+            _cbor_encode(item, parts)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} as CBOR")
+
+def cbor_loads(data: bytes):
+    """Decode one CBOR item
+
+    Covers what the app's encoders produce: definite and indefinite lengths,
+    half, single and double floats. Tags are skipped. Any malformed input
+    raises ValueError.
+    """
+    try:
+        value, offset = _cbor_decode(data, 0)
+    except (TypeError, struct.error, RecursionError) as e:
+        raise ValueError(f"Malformed CBOR data: {str(e)}")
+    if value is _CBOR_BREAK:
+        raise ValueError("Unexpected CBOR break")
+    if offset != len(data):
+        raise ValueError(f"{len(data) - offset} trailing bytes after CBOR item")
+    return value
+
+_CBOR_BREAK = object()
+
+def _cbor_decode(data: bytes, offset: int):
+    if offset >= len(data):
+        raise ValueError("Truncated CBOR data")
+    initial = data[offset]
+    offset += 1
+    major, info = initial >> 5, initial & 0x1f
+    
+    if initial == 0xff:
+        return _CBOR_BREAK, offset
+    if major == 7:
+        simple = {20: False, 21: True, 22: None, 23: None}
+        if info in simple:
+            return simple[info], offset
+        formats = {25: ('>e', 2), 26: ('>f', 4), 27: ('>d', 8)}
+        if info not in formats:
+            raise ValueError(f"Unsupported CBOR simple value {info}")
+        fmt, size = formats[info]
+        return struct.unpack_from(fmt, data, offset)[0], offset + size
+    
+    if info < 24:
+        argument = info
+    elif info <= 27:
+        size = 1 << (info - 24)
+        if offset + size > len(data):
+            raise ValueError("Truncated CBOR data")
+        argument = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+    elif info == 31 and major in (2, 3, 4, 5):
+        argument = None
+    else:
+        raise ValueError(f"Invalid CBOR length encoding {info}")
+    
+    if major == 0:
+        return argument, offset
+    if major == 1:
+        return -1 - argument, offset
+    if major == 6:
+        # Tags only annotate the value that follows
+        return _cbor_decode(data, offset)
+    if major in (2, 3):
+        if argument is None:
+            chunks = []
+            while True:
+                chunk, offset = _cbor_decode(data, offset)
+                if chunk is _CBOR_BREAK:
+                    break
+                chunks.append(chunk)
+            return (b'' if major == 2 else '').join(chunks), offset
+        if offset + argument > len(data):
+            raise ValueError("Truncated CBOR data")
+        raw = data[offset:offset + argument]
+        return (raw if major == 2 else raw.decode('utf-8')), offset + argument
+    if major == 4:
+        items = []
+        while argument is None or len(items) < argument:
+            item, offset = _cbor_decode(data, offset)
+            if item is _CBOR_BREAK:
+                if argument is not None:
+                    raise ValueError("Unexpected CBOR break")
+                break
+            items.append(item)
+        return items, offset
+    
+    mapping = {}
+    while argument is None or len(mapping) < argument:
+        key, offset = _cbor_decode(data, offset)
+        if key is _CBOR_BREAK:
+            if argument is not None:
+                raise ValueError("Unexpected CBOR break")
+            break
+        if isinstance(key, (list, dict)):
+            raise ValueError("CBOR map key is an array or map")
+        mapping[key], offset = _cbor_decode(data, offset)
+        if mapping[key] is _CBOR_BREAK:
+            raise ValueError("Unexpected CBOR break")
+    return mapping, offset
+
+# Binary frames: magic, format version, big-endian payload length, CBOR payload.
+# The magic cannot start a legacy JSON frame, whose length would exceed the frame limit.
+FRAME_MAGIC = b'KB'
+FRAME_VERSION = 1
+FRAME_HEADER = struct.Struct('>2sBI')
+SUPPORTED_FRAMING = ['cbor']
+
+def encode_frame(data: dict) -> bytes:
+    """Serialize a message as one versioned binary frame"""
+    payload = cbor_dumps(data)
+    return FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, len(payload)) + payload
+
+def decode_frame(frame: bytes) -> dict:
+    """Parse one binary frame written by encode_frame or the app"""
+    if len(frame) < FRAME_HEADER.size:
+        raise ValueError("Truncated frame header")
+    magic, version, length = FRAME_HEADER.unpack_from(frame)
+    if magic != FRAME_MAGIC:
+        raise ValueError("Not a binary frame")
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported frame version {version}")
+    if len(frame) - FRAME_HEADER.size != length:
+        raise ValueError(f"Frame length {length} does not match {len(frame) - FRAME_HEADER.size} payload bytes")
+    message = cbor_loads(frame[FRAME_HEADER.size:])
+    if not isinstance(message, dict):
+        raise ValueError("Frame payload is not a map")
+    return message
+
+class ResponseChannel:
+    """Where the responses to a command go"""
+
+    # Set when the device negotiated compression or binary framing in a ping
+    compression: Optional[str] = None
+    framing: str = 'json'
+
+    def send(self, response_data: dict):
+        """Deliver one response to the device"""
+        raise NotImplementedError
+
+    def encode(self, response_data: dict) -> dict:
+        """Apply the negotiated compression, if any"""
+        if self.compression == 'gzip':
+            return compress_fields(response_data, binary=self.framing == 'cbor')
+        return response_data
+
+    def open_stream(self, request_id: str, filename: str) -> DiagnosticStream:
+        """Start streaming a compile's diagnostics to the device"""
+        raise NotImplementedError
+
+class FileChannel(ResponseChannel):
+    """Responds by pushing files into the app's external files directory"""
+
+    def __init__(self, handler: "ADBCommandHandler", app_files_dir: str):
+        self.handler = handler
+        self.app_files_dir = app_files_dir
+
+    def send(self, response_data: dict):
+        """Send response back to Android device"""
+        try:
+            binary = self.framing == 'cbor'
+            extension = 'bin' if binary else 'json'
+            # Responses to commands with an id get their own file, so they can't overwrite each other
+            command_id = response_data.get('command_id')
+            if command_id:
+                response_path = f"{self.app_files_dir}/responses/{command_id}.{extension}"
+            else:
+                response_path = f"{self.app_files_dir}/kotlin_editor_response.{extension}"
+            
+            # Write response to temp file
+            response_file = self.handler.bridge.temp_dir / f"response-{uuid.uuid4().hex[:8]}.{extension}"
+            if binary:
+                response_file.write_bytes(encode_frame(self.encode(response_data)))
+            elif self.compression:
+                # A client that negotiated compression wants compact responses
+                response_file.write_text(json.dumps(self.encode(response_data), separators=(',', ':')))
+            else:
+                response_file.write_text(json.dumps(response_data, indent=2))
+            
+            # Push response to device app files directory
+            try:
+                self.handler._publish_file_to_device(response_file, response_path)
+            finally:
+                # Clean up
+                response_file.unlink()
+            
+            if self.handler.broadcaster is not None:
+                self.handler.broadcaster.notify(str(command_id or response_data.get('id') or response_data.get('type')))
+            
+            print(f"[>] Response sent to device")
+            
+        except Exception as e:
+            print(f"[!] Error sending response: {str(e)}")
+
+    def open_stream(self, request_id: str, filename: str) -> DiagnosticStream:
+        stream_path = f"{self.app_files_dir}/kotlin_editor_stream.jsonl"
+        return self.handler.stream_publisher.open(request_id, filename, stream_path)
+
+class ReplyChannel(ResponseChannel):
+    """Tags every response to one command with the id the app gave that command"""
+
+    def __init__(self, channel: ResponseChannel, command_id: str):
+        self.channel = channel
+        self.command_id = command_id
+
+    # Negotiated settings belong to the underlying channel
+    @property
+    def compression(self) -> Optional[str]:
+        return self.channel.compression
+
+    @compression.setter
+    def compression(self, value: Optional[str]):
+        self.channel.compression = value
+
+    @property
+    def framing(self) -> str:
+        return self.channel.framing
+
+    @framing.setter
+    def framing(self, value: str):
+        self.channel.framing = value
+
+    def send(self, response_data: dict):
+        self.channel.send({**response_data, 'command_id': self.command_id})
+
+    def open_stream(self, request_id: str, filename: str) -> DiagnosticStream:
+        return self.channel.open_stream(request_id, filename)
+
+class SocketChannel(ResponseChannel):
+    """Responds with length-prefixed JSON frames on the connection the command came from
+
+    If the connection has gone away, responses fall back to the file protocol.
+    """
+
+    def __init__(self, connection: socket.socket, fallback: ResponseChannel):
+        self.connection = connection
+        self.fallback = fallback
+        self.lock = threading.Lock()
+
+    def send(self, response_data: dict):
+        """Send response back to Android device"""
+        try:
+            self._send_frame(self.encode(response_data))
+            print(f"[>] Response sent to device over socket")
+        except OSError as e:
+            print(f"[!] Socket send failed ({str(e)}), falling back to file response")
+            self.fallback.send(response_data)
+
+    def open_stream(self, request_id: str, filename: str) -> DiagnosticStream:
+        return DiagnosticStream(request_id, filename, self._emit)
+
+    def _emit(self, record: dict):
+        try:
+            self._send_frame(record)
+        except OSError:
+            # Stream records are advisory; the final response still falls back to a file
+            pass
+
+    def _send_frame(self, data: dict):
+        if self.framing == 'cbor':
+            frame = encode_frame(data)
+        else:
+            payload = json.dumps(data).encode('utf-8')
+            frame = struct.pack('>I', len(payload)) + payload
+        with self.lock:
+            self.connection.sendall(frame)
+
+class SocketTransport:
+    """Receives commands over TCP connections that `adb reverse` forwards from the device
+
+    Each frame is a 4-byte big-endian length followed by that many bytes of
+    UTF-8 JSON, in both directions. A connection stays open for any number
+    of commands, so delivery costs no adb process spawns and no poll delay.
+    Binary CBOR frames (see encode_frame) are recognised by their magic and
+    may be mixed with JSON frames.
+    """
+
+    MAX_FRAME_BYTES = 64 * 1024 * 1024
+    REVERSE_INTERVAL = 30
+
+    def __init__(self, handler: "ADBCommandHandler", port: int):
+        self.handler = handler
+        # Port the app connects to on the device; each device gets its own local port
+        self.port = port
+        self.local_port = 0
+        self.server: Optional[socket.socket] = None
+        self.last_reverse = 0.0
+
+    def start(self):
+        """Listen on localhost and accept device connections in the background"""
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', 0))
+        self.server.listen()
+        self.local_port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, name="socket-transport", daemon=True).start()
+        print(f"[*] Listening on localhost:{self.local_port} for device port {self.port}")
+        self.ensure_reverse()
+
+    def ensure_reverse(self):
+        """(Re)create the adb reverse mapping, which is lost whenever the device reconnects"""
+        if time.time() - self.last_reverse < self.REVERSE_INTERVAL:
+            return
+        self.last_reverse = time.time()
+        try:
+            self.handler.adb.reverse(self.port, self.local_port)
+        except (AdbError, OSError) as e:
+            print(f"[!] adb reverse failed: {str(e)}")
+
+    def stop(self):
+        """Stop accepting connections"""
+        if self.server is not None:
+            self.server.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                break
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            print(f"[+] Device connected over socket")
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection: socket.socket):
+        channel = SocketChannel(connection, self.handler.file_channel)
+        try:
+            while True:
+                header = self._read_exactly(connection, 4)
+                if header is None:
+                    break
+                binary = header.startswith(FRAME_MAGIC)
+                if binary:
+                    rest = self._read_exactly(connection, FRAME_HEADER.size - 4)
+                    if rest is None:
+                        break
+                    header += rest
+                    length = FRAME_HEADER.unpack(header)[2]
+                else:
+                    (length,) = struct.unpack('>I', header)
+                if length > self.MAX_FRAME_BYTES:
+                    print(f"[!] Frame of {length} bytes is too large, closing connection")
+                    break
+                payload = self._read_exactly(connection, length)
+                if payload is None:
+                    break
+                try:
+                    if binary:
+                        command_data = decode_frame(header + payload)
+                    else:
+                        command_data = json.loads(payload.decode('utf-8'))
+                except (UnicodeDecodeError, json.JSONDecodeError) as e:
+                    print(f"[!] JSON parsing error: {str(e)}")
+                    continue
+                except ValueError as e:
+                    print(f"[!] Frame decoding error: {str(e)}")
+                    continue
+                self.handler._handle_command(command_data, channel)
+        except OSError as e:
+            print(f"[!] Socket connection error: {str(e)}")
+        finally:
+            connection.close()
+            print(f"[*] Device socket closed")
+
+    @staticmethod
+    def _read_exactly(connection: socket.socket, size: int) -> Optional[bytes]:
+        data = b''
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+class ShadowMismatch(Exception):
+    """A compile_delta does not apply to the bridge's shadow copy of the file"""
+
+def apply_edits(source: str, edits: List[dict]) -> str:
+    """Apply {"start", "end", "text"} replacements to a source text
+
+    Offsets count UTF-16 code units, as Kotlin strings do, and refer to the
+    text before any of the edits. Ranges must not overlap.
+    """
+    if not isinstance(edits, list):
+        raise ValueError(f"Edits must be a list, not {type(edits).__name__}")
+    data = source.encode('utf-16-le')
+    units = len(data) // 2
+    ranges = []
+    for edit in edits:
+        if not isinstance(edit, dict):
+            raise ValueError(f"Malformed edit: {edit!r}")
+        start, end, text = edit.get('start'), edit.get('end'), edit.get('text', '')
+        if not isinstance(start, int) or not isinstance(end, int) or not isinstance(text, str):
+            raise ValueError(f"Malformed edit: {edit!r}")
+        if not 0 <= start <= end <= units:
+            raise ValueError(f"Edit range {start}-{end} outside a text of {units} units")
+        ranges.append((start, end, text))
+    
+    ranges.sort(key=lambda item: (item[0], item[1]))
+    parts = []
+    position = 0
+    for start, end, text in ranges:
+        if start < position:
+            raise ValueError(f"Edit at {start} overlaps the previous edit")
+        parts.append(data[position * 2:start * 2])
+        parts.append(text.encode('utf-16-le'))
+        position = end
+    parts.append(data[position * 2:])
+    return b''.join(parts).decode('utf-16-le')
+
+class ShadowCopies:
+    """The last source received for each file of one device, with the app's version number
+
+    compile_delta commands are applied to these copies, so only the edits have
+    to cross the USB link. The least recently used files are dropped beyond
+    MAX_FILES; a delta against a dropped file asks the app for a full upload.
+    """
+
+    MAX_FILES = 64
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.copies: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self.applied = 0
+        self.mismatches = 0
+
+    def store(self, filename: str, version: int, source_code: str):
+        """Remember a full source the app sent"""
+        with self.lock:
+            self.copies[filename] = (version, source_code)
+            self.copies.move_to_end(filename)
+            while len(self.copies) > self.MAX_FILES:
+                self.copies.popitem(last=False)
+
+    def version(self, filename: str) -> Optional[int]:
+        """Version of the shadow copy, None if there is none"""
+        with self.lock:
+            copy = self.copies.get(filename)
+            return copy[0] if copy is not None else None
+
+    def apply(self, filename: str, base_version, edits: List[dict],
+              checksum: Optional[str] = None) -> str:
+        """Rebuild a source from the shadow copy at base_version and a list of edits
+
+        Raises ShadowMismatch if the copy is missing or at another version, the
+        edits do not fit it, or the result does not match the SHA-256 checksum.
+        """
+        with self.lock:
+            copy = self.copies.get(filename)
+            try:
+                if copy is None:
+                    raise ShadowMismatch(f"No shadow copy of {filename}")
+                if copy[0] != base_version:
+                    raise ShadowMismatch(f"Shadow copy of {filename} is at version {copy[0]}, not {base_version}")
+                try:
+                    source_code = apply_edits(copy[1], edits)
+                except ValueError as e:
+                    raise ShadowMismatch(str(e))
+                if checksum and hashlib.sha256(source_code.encode('utf-8')).hexdigest() != str(checksum).lower():
+                    raise ShadowMismatch(f"Checksum mismatch after applying edits to {filename}")
+            except ShadowMismatch:
+                self.mismatches += 1
+                raise
+            self.applied += 1
+            return source_code
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'files': len(self.copies), 'deltas_applied': self.applied, 'mismatches': self.mismatches}
+
 class ADBCommandHandler:
     """Handles ADB commands from Android app"""
     
-    def __init__(self, bridge: KotlinCompilerBridge):
+    APP_FILES_DIR = "/storage/emulated/0/Android/data/com.kotlintexteditor/files"
+    
+    def __init__(self, bridge: KotlinCompilerBridge, serial: Optional[str] = None,
+                 port: Optional[int] = None, watch: bool = False,
+                 poll_backoff: Optional[PollBackoff] = None, broadcast: bool = False):
         self.bridge = bridge
+        self.serial = serial
+        self.stopped = threading.Event()
+        self.poll_lock = threading.Lock()
+        self.poll_backoff = poll_backoff or PollBackoff()
+        local_name = re.sub(r'[^\w.-]', '_', serial or 'device')
+        self.stream_publisher = DiagnosticStreamPublisher(bridge.temp_dir / f"stream-{local_name}.jsonl",
+                                                          self._push_file_to_device)
+        # Every adb request of this handler goes to its own device (like adb -s <serial>)
+        self.adb = AdbClient(serial=serial)
+        self.file_channel = FileChannel(self, self.APP_FILES_DIR)
+        self.shadows = ShadowCopies()
+        self.broadcaster = WakeupBroadcaster(self.adb) if broadcast else None
+        self.socket_transport = SocketTransport(self, port) if port else None
+        self.watcher: Optional[CommandFileWatcher] = None
+        if watch:
+            self.watcher = CommandFileWatcher(self.adb, f"{self.APP_FILES_DIR}/kotlin_editor_cmd.txt",
+                                              self._check_adb_commands,
+                                              spool_dir=f"{self.APP_FILES_DIR}/kotlin_editor_spool")
     
     def start_listening(self):
-        """Start listening for ADB commands"""
-        print("[*] Starting ADB command listener...")
-        print("[*] Waiting for Android app commands...")
-        print("[!] Use Ctrl+C to stop")
+        """Poll and dispatch commands for this device until stop() is called"""
+        if self.socket_transport is not None:
+            self.socket_transport.start()
+        if self.watcher is not None:
+            self.watcher.start()
         
         try:
-            while True:
-                # Check for new commands via ADB
+            while not self.stopped.is_set():
+                # The command file still works for apps that cannot use the socket
                 self._check_adb_commands()
-                time.sleep(1)  # Check every second
+                if self.socket_transport is not None:
+                    self.socket_transport.ensure_reverse()
+                # With a watcher, polling is only a safety net for missed events
+                self.stopped.wait(5 if self.watcher is not None else self.poll_backoff.next_interval())
                 
-        except KeyboardInterrupt:
-            print("\n[*] Stopping ADB listener...")
+        finally:
+            if self.watcher is not None:
+                self.watcher.stop()
+            if self.socket_transport is not None:
+                self.socket_transport.stop()
+            self.adb.close()
+    
+    def stop(self):
+        """Make start_listening return, e.g. when the device is unplugged"""
+        self.stopped.set()
     
     def _check_adb_commands(self):
         """Check for pending ADB commands"""
+        # The watcher and the poll loop take turns so a command is claimed once
+        self.poll_lock.acquire()
         try:
             # Check if there's a command file in the app's external files directory
-            app_files_dir = "/storage/emulated/0/Android/data/com.kotlintexteditor/files"
+            app_files_dir = self.APP_FILES_DIR
             command_file_path = f"{app_files_dir}/kotlin_editor_cmd.txt"
             
-            result = subprocess.run([
-                'adb', 'shell', 'ls', command_file_path
-            ], capture_output=True, text=True, timeout=5, shell=True)
+            spool_dir = f"{app_files_dir}/kotlin_editor_spool"
             
-            if result.returncode == 0:
-                # Command file exists, read it
-                self._process_command_file(command_file_path, app_files_dir)
+            commands = self._claim_commands(command_file_path, spool_dir)
+            if commands:
+                self.poll_backoff.activity()
+            for _, raw_content in commands:
+                if raw_content.strip():
+                    self._process_command(raw_content, app_files_dir)
+            
+            # Spooled files are deleted together once they have all been handled
+            spooled = [path for path, _ in commands if path.startswith(f"{spool_dir}/")]
+            if spooled:
+                self.adb.exec_out("rm -f " + " ".join(spooled))
                 
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError):
-            # No command file or ADB error, continue
+        except (AdbError, OSError):
+            # No device or adb server not responding, try again on the next poll
             pass
+        finally:
+            self.poll_lock.release()
+    
+    def _claim_commands(self, command_file_path: str, spool_dir: str) -> List[Tuple[str, bytes]]:
+        """Fetch the command file and every spooled command in a single adb invocation
+
+        The command file is renamed to a claim name, read and deleted, so a
+        command the app writes meanwhile is left for the next poll rather than
+        deleted unread. Spool files are moved into the spool's .claimed
+        directory and left there until they have been processed. Files still
+        being written (*.tmp) are skipped. Claims left behind by an interrupted
+        poll are picked up again. Each command is returned with its claimed path,
+        in order: the command file first, then the spool sorted by file name.
+        """
+        claimed_path = f"{command_file_path}.claimed"
+        claimed_dir = f"{spool_dir}/.claimed"
+        # exec output carries stderr too, so it is silenced to keep the headers parseable
+        script = (f"exec 2>/dev/null; mv {command_file_path} {claimed_path}; "
+                  f"[ -f {claimed_path} ] && echo \"{claimed_path} $(wc -c < {claimed_path})\" && "
+                  f"cat {claimed_path} && rm -f {claimed_path}; "
+                  f"[ -d {spool_dir} ] && {{ mkdir -p {claimed_dir}; "
+                  f"for n in $(ls {spool_dir}); do case $n in *.tmp) ;; "
+                  f"*) mv {spool_dir}/$n {claimed_dir}/$n;; esac; done; "
+                  f"for n in $(ls {claimed_dir}); do echo \"{claimed_dir}/$n $(wc -c < {claimed_dir}/$n)\"; "
+                  f"cat {claimed_dir}/$n; done; }}; true")
+        # exec passes the files through unmodified, without pty newline translation
+        output = self.adb.exec_out(script)
+        return self._split_claimed(output)
     
-    def _process_command_file(self, command_file_path, app_files_dir):
-        """Process command from the device"""
+    @staticmethod
+    def _split_claimed(output: bytes) -> List[Tuple[str, bytes]]:
+        """Split the claim script output into (path, content) pairs
+
+        Every file is preceded by a "<path> <size>" line. Empty files are
+        returned too so they get deleted; any other stray line is skipped.
+        """
+        commands = []
+        offset = 0
+        while offset < len(output):
+            end = output.find(b"\n", offset)
+            if end < 0:
+                break
+            header = output[offset:end].decode('utf-8', errors='replace').split()
+            offset = end + 1
+            if len(header) != 2 or not header[0].startswith('/') or not header[1].isdigit():
+                print(f"[!] Unexpected claim output: {' '.join(header)}")
+                continue
+            size = int(header[1])
+            commands.append((header[0], output[offset:offset + size]))
+            offset += size
+        return commands
+    
+    def _process_command(self, raw_content: bytes, app_files_dir: str):
+        """Process command from the device, written as JSON or as one binary frame"""
         try:
-            # Pull command file
-            cmd_file = self.bridge.temp_dir / "command.txt"
-            result = subprocess.run([
-                'adb', 'pull', command_file_path, str(cmd_file)
-            ], capture_output=True, text=True, timeout=10, shell=True)
+            if raw_content.startswith(FRAME_MAGIC):
+                command_data = decode_frame(raw_content)
+            else:
+                raw_content = raw_content.decode('utf-8', errors='replace')
+                command_data = json.loads(raw_content)
+            # The shared file channel remembers what the device negotiated in its last ping
+            self._handle_command(command_data, self.file_channel)
             
-            if result.returncode == 0 and cmd_file.exists():
-                # Read and process command
-                try:
-                    raw_content = cmd_file.read_text()
-                    print(f"[DEBUG] Raw command file content: '{raw_content}'")
-                    print(f"[DEBUG] Content length: {len(raw_content)} chars")
-                    print(f"[DEBUG] Content bytes: {raw_content.encode('utf-8')}")
-                    
-                    command_data = json.loads(raw_content)
-                    self._handle_command(command_data, app_files_dir)
-                    
-                    # Remove command file from device
-                    subprocess.run(['adb', 'shell', 'rm', command_file_path], 
-                                 capture_output=True, timeout=5, shell=True)
-                    
-                    # Clean up local file
-                    cmd_file.unlink()
-                    
-                except json.JSONDecodeError as je:
-                    print(f"[!] JSON parsing error: {str(je)}")
-                    print(f"[!] Raw content that failed: '{raw_content}'")
-                    print(f"[!] Content repr: {repr(raw_content)}")
-                    # Still clean up the bad file
-                    subprocess.run(['adb', 'shell', 'rm', command_file_path], 
-                                 capture_output=True, timeout=5, shell=True)
-                    cmd_file.unlink()
-                
+        except json.JSONDecodeError as je:
+            print(f"[!] JSON parsing error: {str(je)}")
+            print(f"[!] Raw content that failed: '{raw_content}'")
+            print(f"[!] Content repr: {repr(raw_content)}")
         except Exception as e:
             print(f"[!] Error processing command: {str(e)}")
             print(f"[!] Exception type: {type(e).__name__}")
             import traceback
             print(f"[!] Traceback: {traceback.format_exc()}")
     
-    def _handle_command(self, command_data: dict, app_files_dir: str):
+    def _handle_command(self, command_data: dict, channel: ResponseChannel):
         """Handle a specific command"""
         try:
+            # Large fields may arrive compressed whatever was negotiated
+            command_data = decompress_fields(command_data)
             cmd_type = command_data.get('type')
             
+            # An id from the app is echoed in the response and names its response file
+            command_id = command_data.get('command_id')
+            if command_id is not None:
+                if re.fullmatch(r'[\w.-]{1,64}', str(command_id)):
+                    channel = ReplyChannel(channel, str(command_id))
+                else:
+                    print(f"[!] Ignoring invalid command_id: {command_id!r}")
+            
             if cmd_type == 'compile':
-                self._handle_compile_command(command_data, app_files_dir)
+                self._handle_compile_command(command_data, channel)
             elif cmd_type == 'get_result':
-                self._handle_get_result_command(command_data, app_files_dir)
+                self._handle_get_result_command(command_data, channel)
             elif cmd_type == 'run':
-                self._handle_run_command(command_data, app_files_dir)
+                self._handle_run_command(command_data, channel)
             elif cmd_type == 'ping':
-                self._handle_ping_command(app_files_dir)
+                self._handle_ping_command(command_data, channel)
+            elif cmd_type == 'stats':
+                self._handle_stats_command(channel)
+            elif cmd_type == 'check':
+                self._handle_check_command(command_data, channel)
+            elif cmd_type == 'compile_delta':
+                self._handle_compile_delta_command(command_data, channel)
             else:
                 print(f"[!] Unknown command type: {cmd_type}")
                 
         except Exception as e:
             print(f"[!] Error handling command: {str(e)}")
     
-    def _handle_compile_command(self, command_data: dict, app_files_dir: str):
+    def _handle_compile_command(self, command_data: dict, channel: ResponseChannel):
         """Handle compilation command"""
         filename = command_data.get('filename', 'Main.kt')
         source_code = command_data.get('source_code', '')
+        raw_output = command_data.get('raw_output', False)
+        stream = command_data.get('stream', False)
         
         print(f"[<] Compile request: {filename}")
+        self._store_shadow(command_data, filename, source_code)
+        
+        # Queue the request so the poll loop stays responsive while it compiles
+        request_id = self.bridge.create_compilation_request(filename, source_code,
+                                                            device=self.serial or '',
+                                                            priority=command_data.get('priority'))
+        if not stream:
+            self.bridge.submit_request(
+                request_id,
+                lambda result: self._send_result_to_device(result, channel, raw_output)
+            )
+            return
+        
+        # Forward diagnostics while the compiler is still running, then the usual response
+        diagnostic_stream = channel.open_stream(request_id, filename)
+        
+        def send_streamed_result(result: CompilationResult):
+            diagnostic_stream.finish(result)
+            self._send_result_to_device(result, channel, raw_output)
+        
+        self.bridge.submit_request(request_id, send_streamed_result, diagnostic_stream.diagnostic)
+    
+    def _handle_compile_delta_command(self, command_data: dict, channel: ResponseChannel):
+        """Handle compile_delta command - edits against the shadow copy instead of a full source"""
+        filename = command_data.get('filename', 'Main.kt')
+        base_version = command_data.get('base_version')
+        
+        print(f"[<] Compile delta: {filename} (from version {base_version})")
+        
+        try:
+            source_code = self.shadows.apply(filename, base_version, command_data.get('edits') or [],
+                                             command_data.get('source_sha256'))
+        except ShadowMismatch as e:
+            # The app answers this by sending a full compile
+            print(f"[!] {str(e)}, requesting full upload")
+            channel.send({
+                'type': 'delta_mismatch',
+                'filename': filename,
+                'base_version': base_version,
+                'shadow_version': self.shadows.version(filename),
+                'error_message': str(e)
+            })
+            return
+        
+        if not isinstance(command_data.get('source_version'), int):
+            command_data = {**command_data, 'source_version': base_version + 1}
+        self._handle_compile_command({**command_data, 'source_code': source_code}, channel)
+    
+    def _store_shadow(self, command_data: dict, filename: str, source_code: str):
+        """Keep a full source as the base for later deltas, if the app versions it"""
+        version = command_data.get('source_version')
+        if isinstance(version, int):
+            self.shadows.store(filename, version, source_code)
+    
+    def _handle_check_command(self, command_data: dict, channel: ResponseChannel):
+        """Handle check command - diagnostics only, no bytecode or jar"""
+        filename = command_data.get('filename', 'Main.kt')
+        source_code = command_data.get('source_code', '')
+        raw_output = command_data.get('raw_output', False)
+        
+        print(f"[<] Check request: {filename}")
+        self._store_shadow(command_data, filename, source_code)
         
-        # Create and compile request
-        request_id = self.bridge.create_compilation_request(filename, source_code)
-        result = self.bridge.compile_request(request_id)
+        def send_check_result(result: CompilationResult):
+            check_result = {
+                'type': 'check_result',
+                'id': result.id,
+                'success': result.success,
+                'diagnostics': result.diagnostics,
+                'check_time': result.compilation_time,
+                'cached': result.cached,
+                'cancelled': result.cancelled,
+                'error_message': result.error_message
+            }
+            if raw_output:
+                check_result['stdout'] = result.stdout
+                check_result['stderr'] = result.stderr
+            channel.send(check_result)
         
-        # Send result back to device
-        self._send_result_to_device(result, app_files_dir)
+        request_id = self.bridge.create_compilation_request(filename, source_code, mode='check',
+                                                            device=self.serial or '',
+                                                            priority=command_data.get('priority'))
+        self.bridge.submit_request(request_id, send_check_result)
     
-    def _handle_get_result_command(self, command_data: dict, app_files_dir: str):
+    def _handle_get_result_command(self, command_data: dict, channel: ResponseChannel):
         """Handle get result command"""
         request_id = command_data.get('request_id')
         result = self.bridge.get_result(request_id)
         
         if result:
-            self._send_result_to_device(result, app_files_dir)
+            self._send_result_to_device(result, channel, command_data.get('raw_output', False))
         else:
             error_result = CompilationResult(
                 id=request_id,
                 success=False,
                 error_message=f"Result not found: {request_id}"
             )
-            self._send_result_to_device(error_result, app_files_dir)
+            self._send_result_to_device(error_result, channel)
     
-    def _handle_run_command(self, command_data: dict, app_files_dir: str):
+    def _handle_run_command(self, command_data: dict, channel: ResponseChannel):
         """Handle run command - execute compiled JAR file"""
         try:
             jar_path = command_data.get('jar_path')
@@ -474,7 +3433,7 @@ class ADBCommandHandler:
                     'stdout': '',
                     'stderr': 'JAR path is required for execution'
                 }
-                self._send_response_to_device(error_result, app_files_dir)
+                channel.send(error_result)
                 return
             
             print(f"[<] Running JAR: {jar_path}")
@@ -488,15 +3447,17 @@ class ADBCommandHandler:
                     'stdout': '',
                     'stderr': f'File does not exist: {jar_path}'
                 }
-                self._send_response_to_device(error_result, app_files_dir)
+                channel.send(error_result)
                 return
             
             # Execute the JAR file
+            jar_size = Path(jar_path).stat().st_size
+            timeout = self.bridge.run_timeouts.timeout('run', jar_size, False)
             start_time = time.time()
-            result = subprocess.run([
-                'java', '-jar', jar_path
-            ], capture_output=True, text=True, timeout=30, shell=True)
+            # No shell: the thin-jar classpath stays one argument, and a timeout kills java itself
+            result = run_compiler_process(self.bridge.java_command(jar_path), timeout, os.getcwd())
             execution_time = time.time() - start_time
+            self.bridge.run_timeouts.record('run', jar_size, False, execution_time)
             
             # Prepare result
             run_result = {
@@ -516,17 +3477,17 @@ class ADBCommandHandler:
                 print(f"[!] Program execution failed with exit code {result.returncode}")
                 print(f"[!] Error: {result.stderr.strip()}")
             
-            self._send_response_to_device(run_result, app_files_dir)
+            channel.send(run_result)
             
-        except subprocess.TimeoutExpired:
+        except subprocess.TimeoutExpired as e:
             error_result = {
                 'type': 'run_result',
                 'success': False,
-                'error_message': 'Program execution timeout (30 seconds)',
+                'error_message': f'Program execution timeout ({e.timeout:.0f} seconds)',
                 'stdout': '',
-                'stderr': 'Execution timed out after 30 seconds'
+                'stderr': f'Execution timed out after {e.timeout:.0f} seconds'
             }
-            self._send_response_to_device(error_result, app_files_dir)
+            channel.send(error_result)
             
         except Exception as e:
             print(f"[!] Error running program: {str(e)}")
@@ -537,52 +3498,169 @@ class ADBCommandHandler:
                 'stdout': '',
                 'stderr': str(e)
             }
-            self._send_response_to_device(error_result, app_files_dir)
+            channel.send(error_result)
 
-    def _handle_ping_command(self, app_files_dir: str):
+    def _handle_ping_command(self, command_data: dict, channel: ResponseChannel):
         """Handle ping command"""
         print("[<] Ping request")
+        # The first encoding both sides support applies to later responses on this channel
+        accepted = command_data.get('compression') or []
+        channel.compression = next((c for c in accepted if c in SUPPORTED_COMPRESSION), None)
+        accepted_framing = command_data.get('framing') or []
+        framing = next((f for f in accepted_framing if f in SUPPORTED_FRAMING), 'json')
         ping_result = {
             'type': 'pong',
             'timestamp': time.time(),
-            'bridge_version': '1.0'
+            'bridge_version': '1.0',
+            'transports': ['file'] + (['socket'] if self.socket_transport is not None else []),
+            'port': self.socket_transport.port if self.socket_transport is not None else None,
+            'compression': channel.compression,
+            'supported_compression': SUPPORTED_COMPRESSION,
+            'framing': framing,
+            'frame_version': FRAME_VERSION,
+            'supported_framing': ['json'] + SUPPORTED_FRAMING
+        }
+        # The pong still uses the old framing, so the app can read the outcome
+        channel.send(ping_result)
+        channel.framing = framing
+    
+    def _handle_stats_command(self, channel: ResponseChannel):
+        """Handle stats command"""
+        print("[<] Stats request")
+        stats_result = {
+            'type': 'stats',
+            'timestamp': time.time(),
+            **self.bridge.stats(),
+            'device': self.serial,
+            'polling': self.poll_backoff.stats(),
+            'shadows': self.shadows.stats(),
+            'broadcasts': self.broadcaster.broadcasts if self.broadcaster is not None else None
         }
-        self._send_response_to_device(ping_result, app_files_dir)
+        channel.send(stats_result)
     
-    def _send_result_to_device(self, result: CompilationResult, app_files_dir: str):
+    def _send_result_to_device(self, result: CompilationResult, channel: ResponseChannel,
+                               raw_output: bool = False):
         """Send compilation result back to device"""
         try:
             result_data = asdict(result)
-            self._send_response_to_device(result_data, app_files_dir)
+            # Parsed diagnostics replace the raw compiler text unless it was asked for
+            if not raw_output:
+                del result_data['stdout']
+                del result_data['stderr']
+            channel.send(result_data)
             
         except Exception as e:
             print(f"[!] Error sending result to device: {str(e)}")
     
-    def _send_response_to_device(self, response_data: dict, app_files_dir: str):
-        """Send response back to Android device"""
+    def _push_file_to_device(self, local_file: Path, remote_path: str):
+        """Copy a local file to a path on the device"""
+        self.adb.push(local_file, remote_path)
+
+    def _publish_file_to_device(self, local_file: Path, remote_path: str):
+        """Copy a local file to the device under a temporary name, then rename it into place
+
+        The rename is atomic, so the app never reads a partly written file.
+        """
+        temp_path = f"{remote_path}.tmp"
+        self.adb.push(local_file, temp_path)
+        self.adb.exec_out(f"mv -f {temp_path} {remote_path}")
+
+class DeviceManager:
+    """Runs one ADBCommandHandler per attached device, following hotplug
+
+    Serials come from the adb server's device list, which is re-read every
+    SCAN_INTERVAL seconds. A device in the "device" state gets a handler with
+    its own poll loop thread. A handler is stopped when its device goes away
+    or drops to another state, e.g. offline or unauthorized.
+    """
+
+    SCAN_INTERVAL = 2.0
+
+    def __init__(self, handler_factory: Callable[[str], ADBCommandHandler],
+                 adb: Optional[AdbClient] = None):
+        self.handler_factory = handler_factory
+        self.adb = adb or AdbClient()
+        self.handlers: Dict[str, ADBCommandHandler] = {}
+        self.states: Dict[str, str] = {}
+
+    def start_listening(self):
+        """Serve every attached device until interrupted"""
+        print("[*] Starting ADB command listener...")
+        print("[*] Waiting for Android app commands...")
+        print("[!] Use Ctrl+C to stop")
+        
         try:
-            # Write response to temp file
-            response_file = self.bridge.temp_dir / "response.json"
-            response_file.write_text(json.dumps(response_data, indent=2))
-            
-            # Push response to device app files directory
-            response_path = f"{app_files_dir}/kotlin_editor_response.json"
-            subprocess.run([
-                'adb', 'push', str(response_file), response_path
-            ], capture_output=True, timeout=10, shell=True)
-            
-            # Clean up
-            response_file.unlink()
-            
-            print(f"[>] Response sent to device")
-            
-        except Exception as e:
-            print(f"[!] Error sending response: {str(e)}")
+            while True:
+                self._scan()
+                time.sleep(self.SCAN_INTERVAL)
+                
+        except KeyboardInterrupt:
+            print("\n[*] Stopping ADB listener...")
+        finally:
+            for serial in list(self.handlers):
+                self._detach(serial)
+
+    def _scan(self):
+        try:
+            devices = dict(self.adb.devices())
+        except (AdbError, OSError) as e:
+            print(f"[!] Could not list devices: {str(e)}")
+            return
+        
+        for serial, state in devices.items():
+            if self.states.get(serial) != state and state != 'device':
+                print(f"[!] Device {serial} is {state}, waiting for it to become available")
+            self.states[serial] = state
+            if state == 'device' and serial not in self.handlers:
+                self._attach(serial)
+        
+        for serial in list(self.handlers):
+            if devices.get(serial) != 'device':
+                self._detach(serial)
+        for serial in list(self.states):
+            if serial not in devices:
+                del self.states[serial]
+
+    def _attach(self, serial: str):
+        print(f"[+] Device attached: {serial}")
+        handler = self.handler_factory(serial)
+        self.handlers[serial] = handler
+        threading.Thread(target=handler.start_listening, name=f"device-{serial}", daemon=True).start()
+
+    def _detach(self, serial: str):
+        print(f"[*] Device detached: {serial}")
+        self.handlers.pop(serial).stop()
 
 def main():
     parser = argparse.ArgumentParser(description="Kotlin Text Editor Desktop Compiler Bridge")
     parser.add_argument("--workspace", default="~/kotlin-editor-bridge", 
                        help="Workspace directory (default: ~/kotlin-editor-bridge)")
+    parser.add_argument("--no-daemon", action="store_true",
+                       help="Disable warm compiler daemons and spawn a compiler per request")
+    parser.add_argument("--daemon-heap", type=int, default=1024, metavar="MB",
+                       help="Maximum heap per compiler daemon in MB (default: 1024)")
+    parser.add_argument("--workers", type=int, default=None, metavar="N",
+                       help="Concurrent compile workers (default: CPU cores, capped by available RAM)")
+    parser.add_argument("--cache-size", type=int, default=512, metavar="MB",
+                       help="Size cap of the compile cache, 0 disables (default: 512)")
+    parser.add_argument("--fat-jars", action="store_true",
+                       help="Bundle the Kotlin runtime into every jar instead of sharing one stdlib")
+    parser.add_argument("--port", type=int, default=None,
+                       help="Also accept commands over TCP on this port, forwarded with adb reverse")
+    parser.add_argument("--poll-fast", type=int, default=100, metavar="MS",
+                       help="Poll interval in ms for 10 s after a command arrives (default: 100)")
+    parser.add_argument("--poll-idle-max", type=float, default=2.0, metavar="SECONDS",
+                       help="Longest poll interval once idle, reached by exponential backoff (default: 2)")
+    parser.add_argument("--watch", action="store_true",
+                       help="Detect commands with a long-running device shell instead of 1 s polling")
+    parser.add_argument("--broadcast", action="store_true",
+                       help="Wake the app with an am broadcast whenever a response file is pushed")
+    parser.add_argument("--timeout-range", type=float, nargs=2, default=[10, 120], metavar=("MIN", "MAX"),
+                       help="Bounds in seconds for learned compile timeouts (default: 10 120)")
+    parser.add_argument("--run-timeout-range", type=float, nargs=2, default=[30, 300], metavar=("MIN", "MAX"),
+                       help="Bounds in seconds for learned program run timeouts (default: 30 300)")
+    parser.add_argument("--timeout-factor", type=float, default=3.0,
+                       help="Timeouts are the p99 of past durations times this factor (default: 3)")
     
     args = parser.parse_args()
     
@@ -596,9 +3674,18 @@ def main():
     print(f"Started at: {datetime.now()}")
     print("=" * 60)
     
+    bridge = None
     try:
         # Create bridge service
-        bridge = KotlinCompilerBridge(str(workspace_path))
+        bridge = KotlinCompilerBridge(str(workspace_path),
+                                      use_daemon=not args.no_daemon,
+                                      daemon_heap_mb=args.daemon_heap,
+                                      workers=args.workers,
+                                      cache_size_mb=args.cache_size,
+                                      thin_jars=not args.fat_jars,
+                                      timeout_range=tuple(args.timeout_range),
+                                      run_timeout_range=tuple(args.run_timeout_range),
+                                      timeout_factor=args.timeout_factor)
         
         # Check dependencies
         deps_ok, issues = bridge.check_dependencies()
@@ -614,9 +3701,18 @@ def main():
         # Clean up old files
         bridge.cleanup_old_files()
         
+        # Share one Kotlin runtime between thin jars
+        bridge.prepare_runtime()
+        
+        # Start warm compilers in the background
+        bridge.start_daemons()
+        
         # Start ADB command handler
-        handler = ADBCommandHandler(bridge)
-        handler.start_listening()
+        devices = DeviceManager(lambda serial: ADBCommandHandler(
+            bridge, serial, port=args.port, watch=args.watch,
+            poll_backoff=PollBackoff(args.poll_fast / 1000, args.poll_idle_max),
+            broadcast=args.broadcast))
+        devices.start_listening()
         
         return 0
         
@@ -626,6 +3722,9 @@ def main():
     except Exception as e:
         print(f"\n[!] Bridge service error: {str(e)}")
         return 1
+    finally:
+        if bridge is not None:
+            bridge.shutdown()
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,169 @@
+"""In-process fake of the adb server's host protocol, for testing AdbClient
+
+Implements the subset the bridge uses: host:devices, host:transport,
+shell:/exec: (answered by a callable), reverse:forward and the sync
+protocol (SEND, RECV, QUIT) against an in-memory file system.
+"""
+
+import socket
+import struct
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class FakeAdbServer:
+    """Listens on an ephemeral localhost port; use .port with AdbClient"""
+
+    def __init__(self, devices: Optional[List[Tuple[str, str]]] = None,
+                 exec_handler: Optional[Callable[[str, str], bytes]] = None):
+        self.devices = devices if devices is not None else [("emulator-5554", "device")]
+        # (serial, command) -> output
+        self.exec_handler = exec_handler or (lambda serial, command: b"")
+        # (serial, remote path) -> content
+        self.files: Dict[Tuple[str, str], bytes] = {}
+        self.requests: List[str] = []
+        self.reverses: List[Tuple[str, str]] = []
+        self.connections = 0
+        self.sync_sessions = 0
+        self.open_syncs: List[socket.socket] = []
+        self.lock = threading.Lock()
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def close(self):
+        self.server.close()
+
+    def drop_sync_connections(self):
+        """Close every open sync connection, as an adb server restart would"""
+        with self.lock:
+            connections, self.open_syncs = self.open_syncs, []
+        for connection in connections:
+            connection.shutdown(socket.SHUT_RDWR)
+            connection.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            with self.lock:
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection: socket.socket):
+        try:
+            serial = None
+            while True:
+                request = self._read_request(connection)
+                with self.lock:
+                    self.requests.append(request)
+                if request == "host:devices":
+                    listing = "".join(f"{s}\t{state}\n" for s, state in self.devices).encode()
+                    connection.sendall(b"OKAY" + f"{len(listing):04x}".encode() + listing)
+                    return
+                if request.startswith("host:transport"):
+                    serial = self._select(request)
+                    if serial is None:
+                        self._fail(connection, "device not found")
+                        return
+                    connection.sendall(b"OKAY")
+                    continue
+                if serial is None:
+                    self._fail(connection, f"unknown service {request}")
+                    return
+                if request.startswith(("shell:", "exec:")):
+                    output = self.exec_handler(serial, request.split(":", 1)[1])
+                    connection.sendall(b"OKAY" + output)
+                    return
+                if request.startswith("reverse:forward:"):
+                    with self.lock:
+                        self.reverses.append((serial, request[len("reverse:forward:"):]))
+                    connection.sendall(b"OKAYOKAY")
+                    return
+                if request == "sync:":
+                    connection.sendall(b"OKAY")
+                    with self.lock:
+                        self.sync_sessions += 1
+                        self.open_syncs.append(connection)
+                    self._serve_sync(connection, serial)
+                    return
+                self._fail(connection, f"unknown service {request}")
+                return
+        except (EOFError, OSError):
+            pass
+        finally:
+            connection.close()
+
+    def _select(self, request: str) -> Optional[str]:
+        ready = [s for s, state in self.devices if state == "device"]
+        if request == "host:transport-any":
+            return ready[0] if ready else None
+        serial = request[len("host:transport:"):]
+        return serial if serial in ready else None
+
+    def _serve_sync(self, connection: socket.socket, serial: str):
+        while True:
+            request_id, argument = self._read_sync(connection)
+            if request_id == b"QUIT":
+                return
+            if request_id == b"SEND":
+                path = argument.decode().rsplit(",", 1)[0]
+                chunks = []
+                while True:
+                    chunk_id, data = self._read_sync(connection)
+                    if chunk_id == b"DONE":
+                        break
+                    chunks.append(data)
+                if path.startswith("/readonly/"):
+                    self._sync_reply(connection, b"FAIL", b"Read-only file system")
+                    continue
+                with self.lock:
+                    self.files[(serial, path)] = b"".join(chunks)
+                self._sync_reply(connection, b"OKAY", b"")
+            elif request_id == b"RECV":
+                with self.lock:
+                    content = self.files.get((serial, argument.decode()))
+                if content is None:
+                    self._sync_reply(connection, b"FAIL", b"No such file or directory")
+                    continue
+                for offset in range(0, len(content), 64 * 1024):
+                    self._sync_reply(connection, b"DATA", content[offset:offset + 64 * 1024])
+                self._sync_reply(connection, b"DONE", b"")
+            else:
+                self._sync_reply(connection, b"FAIL", b"unknown sync request")
+                return
+
+    def _read_sync(self, connection: socket.socket) -> Tuple[bytes, bytes]:
+        header = self._read_exactly(connection, 8)
+        request_id, length = header[:4], struct.unpack("<I", header[4:])[0]
+        if request_id == b"DONE":
+            # DONE carries a timestamp in place of a length
+            return request_id, b""
+        return request_id, self._read_exactly(connection, length)
+
+    @staticmethod
+    def _sync_reply(connection: socket.socket, status: bytes, data: bytes):
+        connection.sendall(status + struct.pack("<I", len(data)) + data)
+
+    def _read_request(self, connection: socket.socket) -> str:
+        length = int(self._read_exactly(connection, 4), 16)
+        return self._read_exactly(connection, length).decode()
+
+    @staticmethod
+    def _fail(connection: socket.socket, message: str):
+        data = message.encode()
+        connection.sendall(b"FAIL" + f"{len(data):04x}".encode() + data)
+
+    @staticmethod
+    def _read_exactly(connection: socket.socket, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise EOFError
+            data += chunk
+        return data
@@ -0,0 +1,18 @@
+"""Shared helpers for the desktop bridge tests"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+BRIDGE_PATH = Path(__file__).resolve().parent.parent / "desktop-compiler-bridge.py"
+
+
+def load_bridge():
+    """Import desktop-compiler-bridge.py, whose file name is not a valid module name"""
+    module = sys.modules.get("desktop_compiler_bridge")
+    if module is None:
+        spec = importlib.util.spec_from_file_location("desktop_compiler_bridge", BRIDGE_PATH)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["desktop_compiler_bridge"] = module
+        spec.loader.exec_module(module)
+    return module
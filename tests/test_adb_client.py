@@ -0,0 +1,103 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from fake_adb_server import FakeAdbServer
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+
+class AdbClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.commands = []
+
+        def exec_handler(serial, command):
+            self.commands.append((serial, command))
+            return f"{serial}: {command}".encode()
+
+        self.server = FakeAdbServer(devices=[("emulator-5554", "device"), ("R58M", "device"),
+                                             ("0123", "unauthorized")],
+                                    exec_handler=exec_handler)
+        self.client = bridge.AdbClient(port=self.server.port, serial="R58M", timeout=5)
+        self.tmp = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_devices_lists_serial_and_state(self):
+        self.assertEqual(self.client.devices(), [("emulator-5554", "device"), ("R58M", "device"),
+                                                 ("0123", "unauthorized")])
+
+    def test_exec_out_runs_on_the_clients_device(self):
+        self.assertEqual(self.client.exec_out("cat a"), b"R58M: cat a")
+        self.assertEqual(self.client.shell("ls", serial="emulator-5554"), b"emulator-5554: ls")
+        self.assertIn("host:transport:R58M", self.server.requests)
+        self.assertEqual(self.commands, [("R58M", "cat a"), ("emulator-5554", "ls")])
+
+    def test_unknown_device_raises_adb_error(self):
+        with self.assertRaisesRegex(bridge.AdbError, "device not found"):
+            self.client.exec_out("true", serial="0123")
+
+    def test_reverse_waits_for_both_acknowledgements(self):
+        self.client.reverse(8765, 40123)
+        self.assertEqual(self.server.reverses, [("R58M", "tcp:8765;tcp:40123")])
+
+    def test_push_then_pull_round_trips_large_files(self):
+        content = bytes(range(256)) * 1000  # several sync chunks
+        source = self.tmp / "in.bin"
+        source.write_bytes(content)
+        self.client.push(source, "/data/local/tmp/in.bin")
+        self.assertEqual(self.server.files[("R58M", "/data/local/tmp/in.bin")], content)
+
+        self.client.pull("/data/local/tmp/in.bin", self.tmp / "out.bin")
+        self.assertEqual((self.tmp / "out.bin").read_bytes(), content)
+
+    def test_sync_failures_raise_adb_error(self):
+        source = self.tmp / "in.txt"
+        source.write_text("x")
+        with self.assertRaisesRegex(bridge.AdbError, "Read-only"):
+            self.client.push(source, "/readonly/in.txt")
+        with self.assertRaisesRegex(bridge.AdbError, "No such file"):
+            self.client.pull("/missing", self.tmp / "out.txt")
+
+    def test_sync_connections_are_reused(self):
+        source = self.tmp / "in.txt"
+        source.write_text("x")
+        for index in range(5):
+            self.client.push(source, f"/sdcard/{index}.txt")
+        self.client.pull("/sdcard/0.txt", self.tmp / "out.txt")
+        self.assertEqual(self.server.sync_sessions, 1)
+
+    def test_connection_is_not_reused_after_a_failure(self):
+        source = self.tmp / "in.txt"
+        source.write_text("x")
+        with self.assertRaises(bridge.AdbError):
+            self.client.pull("/missing", self.tmp / "out.txt")
+        self.client.push(source, "/sdcard/in.txt")
+        self.assertEqual(self.server.sync_sessions, 2)
+
+    def test_stale_pooled_connection_is_retried_on_a_fresh_one(self):
+        source = self.tmp / "in.txt"
+        source.write_text("x")
+        self.client.push(source, "/sdcard/before.txt")
+        self.server.drop_sync_connections()
+        self.client.push(source, "/sdcard/after.txt")
+        self.assertEqual(self.server.files[("R58M", "/sdcard/after.txt")], b"x")
+        self.client.pull("/sdcard/after.txt", self.tmp / "out.txt")
+        self.assertEqual((self.tmp / "out.txt").read_text(), "x")
+        self.assertEqual(self.server.sync_sessions, 2)
+
+    def test_refused_transfer_on_a_pooled_connection_is_not_retried(self):
+        source = self.tmp / "in.txt"
+        source.write_text("x")
+        self.client.push(source, "/sdcard/in.txt")
+        with self.assertRaisesRegex(bridge.AdbError, "Read-only"):
+            self.client.push(source, "/readonly/in.txt")
+        self.assertEqual(self.server.sync_sessions, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+# Speaks the daemon protocol; the single argument is how long the "compile" takes
+FAKE_DAEMON = """\
+import sys, time
+print("READY", flush=True)
+for header in sys.stdin:
+    verb, token, count = header.split()
+    args = [sys.stdin.readline().strip() for _ in range(int(count))]
+    time.sleep(float(args[0]))
+    print("Main.kt:1:1: warning: done", flush=True)
+    print(f"{token} EXIT 0 1000", flush=True)
+"""
+
+
+class DaemonInterruptTest(unittest.TestCase):
+
+    def setUp(self):
+        script = Path(tempfile.mkdtemp()) / "daemon.py"
+        script.write_text(FAKE_DAEMON)
+        self.daemon = bridge.CompilerDaemon("fake", [sys.executable, str(script)], str(script.parent))
+        self.daemon.INTERRUPT_GRACE = 1.0
+        self.assertTrue(self.daemon.start())
+
+    def tearDown(self):
+        self.daemon.stop()
+
+    def compile_and_cancel(self, duration: float, cancel_after: float):
+        token = bridge.CancellationToken()
+        threading.Timer(cancel_after, token.cancel, args=("superseded",)).start()
+        return token, lambda: self.daemon.compile([str(duration)], timeout=30, cancel=token)
+
+    def test_short_interrupted_compile_keeps_the_daemon_warm(self):
+        pid = self.daemon.process.pid
+        token, compile_ = self.compile_and_cancel(0.3, 0.1)
+        exit_code, _ = compile_()
+        self.assertEqual(exit_code, 0)
+        self.assertTrue(token.cancelled)
+        self.assertEqual(self.daemon.process.pid, pid)
+        self.assertEqual(self.daemon.compile_count, 1)
+        self.assertEqual(self.daemon.restarts, 0)
+
+    def test_long_interrupted_compile_is_killed_after_the_grace_period(self):
+        token, compile_ = self.compile_and_cancel(30, 0.1)
+        started = time.time()
+        with self.assertRaises(bridge.CompileCancelled):
+            compile_()
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(self.daemon.restarts, 1)
+
+    def test_preempted_compile_that_finishes_is_not_retried(self):
+        token = bridge.CancellationToken()
+        threading.Timer(0.1, token.preempt).start()
+        self.daemon.compile(["0.3"], timeout=30, cancel=token)
+        token.check()
+
+
+@unittest.skipIf(os.name == 'nt', "uses a POSIX shell")
+class ProcessTreeTest(unittest.TestCase):
+
+    def test_cancel_kills_the_wrappers_children(self):
+        # Like kotlinc: a wrapper script whose child holds the output pipes
+        token = bridge.CancellationToken()
+        threading.Timer(0.3, token.cancel, args=("superseded",)).start()
+        started = time.time()
+        with self.assertRaises(bridge.CompileCancelled):
+            bridge.run_compiler_process(["sh", "-c", "sleep 30; echo done"], 60, tempfile.gettempdir(),
+                                        cancel=token)
+        self.assertLess(time.time() - started, 10)
+
+    def test_timeout_kills_the_wrappers_children(self):
+        started = time.time()
+        with self.assertRaises(subprocess.TimeoutExpired):
+            bridge.run_compiler_process(["sh", "-c", "sleep 30; echo done"], 0.3, tempfile.gettempdir())
+        self.assertLess(time.time() - started, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import threading
+import unittest
+
+from fake_adb_server import FakeAdbServer
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+SPOOL = f"{bridge.ADBCommandHandler.APP_FILES_DIR}/kotlin_editor_spool"
+
+
+class SplitClaimedTest(unittest.TestCase):
+
+    def test_splits_by_size_headers(self):
+        output = (b"/cmd.txt.claimed 15\n{\"type\":\"ping\"}"
+                  b"/spool/.claimed/0001.json 17\n{\"type\":\"stats\"}\n"
+                  b"/spool/.claimed/0002.bin 4\nKB\n\x00")
+        self.assertEqual(bridge.ADBCommandHandler._split_claimed(output), [
+            ("/cmd.txt.claimed", b'{"type":"ping"}'),
+            ("/spool/.claimed/0001.json", b'{"type":"stats"}\n'),
+            ("/spool/.claimed/0002.bin", b"KB\n\x00"),
+        ])
+
+    def test_tolerates_padded_sizes_and_keeps_empty_files(self):
+        output = b"/a     2\n{}/b 0\n"
+        self.assertEqual(bridge.ADBCommandHandler._split_claimed(output), [("/a", b"{}"), ("/b", b"")])
+
+    def test_resyncs_after_unexpected_output(self):
+        output = b"/a 2\n{}mv: can't rename '/c': Permission denied\n/b 2\n[]"
+        self.assertEqual(bridge.ADBCommandHandler._split_claimed(output), [("/a", b"{}"), ("/b", b"[]")])
+
+    def test_empty_output(self):
+        self.assertEqual(bridge.ADBCommandHandler._split_claimed(b""), [])
+
+
+class SpoolPollTest(unittest.TestCase):
+
+    def setUp(self):
+        self.exec_commands = []
+
+        def exec_handler(serial, command):
+            self.exec_commands.append(command)
+            if not command.startswith("rm "):
+                return self.claim_output
+            return b""
+
+        self.claim_output = (f"{SPOOL}/.claimed/0001.json 15\n".encode() + b'{"type":"ping"}'
+                             + f"{SPOOL}/.claimed/0002.json 16\n".encode() + b'{"type":"stats"}')
+        self.server = FakeAdbServer(exec_handler=exec_handler)
+        self.handler = bridge.ADBCommandHandler.__new__(bridge.ADBCommandHandler)
+        self.handler.adb = bridge.AdbClient(port=self.server.port, timeout=5)
+        self.handler.poll_lock = threading.Lock()
+        self.handler.poll_backoff = bridge.PollBackoff()
+        self.processed = []
+        self.handler._process_command = lambda raw, app_files_dir: self.processed.append(raw)
+
+    def tearDown(self):
+        self.handler.adb.close()
+        self.server.close()
+
+    def test_processes_in_order_then_deletes_in_one_batch(self):
+        self.handler._check_adb_commands()
+        self.assertEqual(self.processed, [b'{"type":"ping"}', b'{"type":"stats"}'])
+        self.assertEqual(len(self.exec_commands), 2)
+        self.assertEqual(self.exec_commands[1],
+                         f"rm -f {SPOOL}/.claimed/0001.json {SPOOL}/.claimed/0002.json")
+
+    def test_empty_spool_files_are_deleted_without_dispatch(self):
+        self.claim_output = (f"{SPOOL}/.claimed/0001.json 0\n".encode()
+                             + f"{SPOOL}/.claimed/0002.json 16\n".encode() + b'{"type":"stats"}')
+        self.handler._check_adb_commands()
+        self.assertEqual(self.processed, [b'{"type":"stats"}'])
+        self.assertEqual(self.exec_commands[1],
+                         f"rm -f {SPOOL}/.claimed/0001.json {SPOOL}/.claimed/0002.json")
+
+    def test_claim_script_silences_stderr(self):
+        self.handler._check_adb_commands()
+        self.assertTrue(self.exec_commands[0].startswith("exec 2>/dev/null; "))
+
+
+if __name__ == '__main__':
+    unittest.main()
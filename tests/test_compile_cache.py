@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+
+class CompileCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = Path(tempfile.mkdtemp())
+        # Unrelated output beyond the cap must not affect the cache
+        (self.root / "other.jar").write_bytes(b"x" * 10000)
+        self.cache = bridge.CompileCache(self.root / "cache", 3000)
+
+    def put(self, key: str, size: int):
+        artifacts = self.root / f"staging-{key}"
+        artifacts.mkdir()
+        (artifacts / "Main.jar").write_bytes(b"x" * size)
+        result = bridge.CompilationResult(id=key, success=True, output_file=str(artifacts / "Main.jar"))
+        return self.cache.put(key, result, artifacts), artifacts
+
+    def test_stored_entry_survives_eviction(self):
+        for key in ("a", "b", "c"):
+            stored, _ = self.put(key, 1200)
+            self.assertTrue(os.path.exists(stored.output_file))
+        self.assertEqual(list(self.cache.entries), ["b", "c"])
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_entry_larger_than_the_cache_is_not_stored(self):
+        stored, artifacts = self.put("big", 5000)
+        self.assertIsNone(stored)
+        self.assertTrue((artifacts / "Main.jar").exists())
+        self.assertEqual(len(self.cache.entries), 0)
+
+
+class CacheabilityTest(unittest.TestCase):
+
+    def test_only_successes_and_source_errors_are_cached(self):
+        def cacheable(success, exit_code):
+            result = bridge.CompilationResult(id="", success=success, exit_code=exit_code)
+            return bridge.KotlinCompilerBridge._is_cacheable(result)
+
+        self.assertTrue(cacheable(True, 0))
+        self.assertTrue(cacheable(False, 1))
+        # kotlinc INTERNAL_ERROR, a crashed or out-of-memory daemon, javac system errors
+        for exit_code in (2, 3, 4):
+            self.assertFalse(cacheable(False, exit_code))
+        # Timeouts and bridge errors never got an exit code
+        self.assertFalse(cacheable(False, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+JAVAC_OUTPUT = """\
+Main.java:3: error: cannot find symbol
+        foo();
+        ^
+  symbol:   method foo()
+  location: class Main
+Main.java:5: warning: [unchecked] unchecked call to add(E) as a member of the raw type List
+        list.add("x");
+                ^
+  where E is a type-variable:
+    E extends Object declared in interface List
+Note: Some input files use unchecked or unsafe operations.
+Note: Recompile with -Xlint:unchecked for details.
+1 error
+1 warning
+"""
+
+KOTLINC_OUTPUT = """\
+Main.kt:2:5: error: unresolved reference: foo
+    foo()
+    ^^^
+Main.kt:4:9: warning: variable 'x' is never used
+    val x = 1
+        ^
+warning: some JAR files in the classpath have the Kotlin Runtime library bundled into them
+"""
+
+
+class DiagnosticParserTest(unittest.TestCase):
+
+    def test_javac_details_are_kept_and_notes_are_not(self):
+        error, warning = bridge.parse_diagnostics(JAVAC_OUTPUT)
+        self.assertEqual(error, {
+            'file': 'Main.java', 'line': 3, 'column': 9, 'severity': 'error', 'code': None,
+            'message': "cannot find symbol\nsymbol:   method foo()\nlocation: class Main"
+        })
+        self.assertEqual(warning['code'], 'unchecked')
+        self.assertEqual(warning['column'], 17)
+        self.assertEqual(warning['message'],
+                         "unchecked call to add(E) as a member of the raw type List\n"
+                         "where E is a type-variable:\n"
+                         "E extends Object declared in interface List")
+
+    def test_notes_end_a_diagnostic_without_a_summary(self):
+        output = JAVAC_OUTPUT.replace("1 error\n1 warning\n", "")
+        self.assertNotIn("Note:", bridge.parse_diagnostics(output)[-1]['message'])
+
+    def test_unindented_source_line_is_not_mistaken_for_a_note(self):
+        output = "Main.java:1: error: class, interface, or enum expected\nvoid main() {}\n^\n1 error\n"
+        (diagnostic,) = bridge.parse_diagnostics(output)
+        self.assertEqual((diagnostic['column'], diagnostic['message']),
+                         (1, "class, interface, or enum expected"))
+
+    def test_kotlinc(self):
+        diagnostics = bridge.parse_diagnostics(KOTLINC_OUTPUT)
+        self.assertEqual([(d['line'], d['column'], d['severity'], d['message']) for d in diagnostics], [
+            (2, 5, 'error', "unresolved reference: foo"),
+            (4, 9, 'warning', "variable 'x' is never used"),
+            (None, None, 'warning',
+             "some JAR files in the classpath have the Kotlin Runtime library bundled into them"),
+        ])
+
+    def test_incremental_feed_completes_at_the_earliest_line(self):
+        parser = bridge.DiagnosticParser()
+        completed_at = []
+        for number, line in enumerate(JAVAC_OUTPUT.splitlines()):
+            if parser.feed(line):
+                completed_at.append(number)
+        # The error completes at the next header, the warning at the first Note line
+        self.assertEqual(completed_at, [5, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import json
+import socket
+import struct
+import threading
+import unittest
+
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+
+class CborTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        value = {
+            'ints': [0, 23, 24, 255, 256, 65536, 2 ** 32, 2 ** 63, -1, -25, -2 ** 40],
+            'float': 0.1, 'none': None, 'flags': [True, False],
+            'text': 'héllo 😀', 'bytes': b'\x00\xff', 'long': 'x' * 70000,
+            'nested': {'empty': {}, 'list': []},
+        }
+        self.assertEqual(bridge.cbor_loads(bridge.cbor_dumps(value)), value)
+
+    def test_known_encodings(self):
+        # Examples from RFC 8949 appendix A
+        self.assertEqual(bridge.cbor_dumps(1000), bytes.fromhex('1903e8'))
+        self.assertEqual(bridge.cbor_dumps(-1000), bytes.fromhex('3903e7'))
+        self.assertEqual(bridge.cbor_dumps({'a': 1, 'b': [2, 3]}), bytes.fromhex('a26161016162820203'))
+        self.assertEqual(bridge.cbor_loads(bytes.fromhex('f93c00')), 1.0)
+        self.assertEqual(bridge.cbor_loads(bytes.fromhex('fa47c35000')), 100000.0)
+
+    def test_indefinite_lengths_and_tags(self):
+        self.assertEqual(bridge.cbor_loads(bytes.fromhex('bf61610161629f0203ffff')), {'a': 1, 'b': [2, 3]})
+        self.assertEqual(bridge.cbor_loads(bytes.fromhex('7f657374726561646d696e67ff')), 'streaming')
+        self.assertEqual(bridge.cbor_loads(bytes.fromhex('5f42010243030405ff')), b'\x01\x02\x03\x04\x05')
+        self.assertEqual(bridge.cbor_loads(bytes.fromhex('c11a514b67b0')), 1363896240)
+
+    def test_malformed_input_raises_value_error(self):
+        malformed = [
+            b'',
+            bytes.fromhex('62 61'),          # truncated text
+            bytes.fromhex('fb 3ff0'),        # truncated double
+            bytes.fromhex('a1 80 01'),       # array as map key
+            bytes.fromhex('a1 a0 01'),       # map as map key
+            bytes.fromhex('01 02'),          # trailing bytes
+            bytes.fromhex('ff'),             # lone break
+            bytes.fromhex('82 01 ff'),       # break in a definite array
+            bytes.fromhex('7f 41 61 ff'),    # byte string chunk in a text string
+            bytes.fromhex('1c'),             # reserved length encoding
+            b'\x81' * 100000,                # nesting deeper than the stack
+        ]
+        for data in malformed:
+            with self.subTest(data=data[:8].hex()):
+                with self.assertRaises(ValueError):
+                    bridge.cbor_loads(data)
+
+    def test_unencodable_type(self):
+        with self.assertRaises(TypeError):
+            bridge.cbor_dumps({'value': object()})
+
+
+class FrameTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        frame = bridge.encode_frame({'type': 'ping', 'source_code': b'fun main() {}'})
+        self.assertEqual(frame[:3], b'KB\x01')
+        self.assertEqual(bridge.decode_frame(frame), {'type': 'ping', 'source_code': b'fun main() {}'})
+
+    def test_rejects_bad_frames(self):
+        frame = bridge.encode_frame({'type': 'ping'})
+        payload = bridge.cbor_dumps([1])
+        bad_frames = [
+            frame[:5],
+            b'XX' + frame[2:],
+            frame[:2] + b'\x02' + frame[3:],
+            frame + b'\x00',
+            bridge.FRAME_HEADER.pack(b'KB', 1, len(payload)) + payload,
+        ]
+        for data in bad_frames:
+            with self.subTest(data=data.hex()):
+                with self.assertRaises(ValueError):
+                    bridge.decode_frame(data)
+
+    def test_compressed_fields_round_trip(self):
+        data = {'type': 'run_result', 'stdout': 'line\n' * 2000, 'stderr': 'short'}
+        for binary in (False, True):
+            encoded = bridge.compress_fields(data, binary=binary)
+            self.assertIsInstance(encoded['stdout'], dict)
+            self.assertEqual(encoded['stderr'], 'short')
+            self.assertEqual(bridge.decompress_fields(encoded), data)
+
+
+class SocketTransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handled = []
+        handler = type('Handler', (), {})()
+        handler.file_channel = None
+        handler._handle_command = lambda command, channel: self.handled.append(command)
+        transport = bridge.SocketTransport(handler, 8765)
+        self.device, bridge_end = socket.socketpair()
+        self.thread = threading.Thread(target=transport._serve, args=(bridge_end,), daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.device.close()
+        self.thread.join(5)
+
+    def test_malformed_frame_does_not_end_the_connection(self):
+        # A map keyed by an array cannot be turned into a dict
+        payload = bytes.fromhex('a1 80 01')
+        self.device.sendall(bridge.FRAME_HEADER.pack(b'KB', 1, len(payload)) + payload)
+        self.device.sendall(bridge.encode_frame({'type': 'ping'}))
+        legacy = json.dumps({'type': 'stats'}).encode()
+        self.device.sendall(struct.pack('>I', len(legacy)) + legacy)
+        self.device.close()
+        self.thread.join(5)
+        self.assertFalse(self.thread.is_alive())
+        self.assertEqual(self.handled, [{'type': 'ping'}, {'type': 'stats'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
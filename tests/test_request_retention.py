@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+
+class RequestRetentionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bridge = bridge.KotlinCompilerBridge(tempfile.mkdtemp(), use_daemon=False,
+                                                  cache_size_mb=0, workers=1)
+        self.bridge.MAX_RESULTS = 3
+
+    def tearDown(self):
+        self.bridge.shutdown()
+
+    def check(self, source: str) -> str:
+        request_id = self.bridge.create_compilation_request("Main.kt", source, mode='check')
+        # Whether or not a compiler is installed here, the request finishes with a result
+        self.bridge.compile_request(request_id)
+        return request_id
+
+    def test_finished_requests_drop_their_source(self):
+        request_id = self.check("fun main() {}")
+        self.assertNotIn(request_id, self.bridge.requests)
+        self.assertIsNotNone(self.bridge.get_result(request_id))
+
+    def test_only_the_newest_results_are_kept(self):
+        request_ids = [self.check(f"fun main() {{ println({index}) }}") for index in range(5)]
+        self.assertEqual(list(self.bridge.results), request_ids[-3:])
+        self.assertIsNone(self.bridge.get_result(request_ids[0]))
+
+    def test_pending_requests_are_still_superseded(self):
+        first = self.bridge.create_compilation_request("Main.kt", "fun main() {}", mode='check')
+        self.bridge.create_compilation_request("Main.kt", "fun main() { }", mode='check')
+        self.assertTrue(self.bridge.compile_request(first).cancelled)
+        self.assertNotIn(first, self.bridge.requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import sys
+import tempfile
+import time
+import types
+import unittest
+from pathlib import Path
+
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+
+class RecordingChannel(bridge.ResponseChannel):
+
+    def __init__(self):
+        self.sent = []
+
+    def send(self, response_data: dict):
+        self.sent.append(response_data)
+
+
+class RunCommandTest(unittest.TestCase):
+
+    def setUp(self):
+        self.jar = Path(tempfile.mkdtemp()) / "Main.jar"
+        self.jar.write_bytes(b"")
+        self.program = "print('ok')"
+        fake_bridge = types.SimpleNamespace(
+            run_timeouts=bridge.TimeoutModel(1, 1, 1),
+            # Arguments with spaces and quotes, as in a thin-jar classpath
+            java_command=lambda jar_path: [sys.executable, "-c", self.program, "a b", "'c'"])
+        self.handler = bridge.ADBCommandHandler.__new__(bridge.ADBCommandHandler)
+        self.handler.bridge = fake_bridge
+        self.channel = RecordingChannel()
+
+    def run_jar(self) -> dict:
+        self.handler._handle_run_command({'type': 'run', 'jar_path': str(self.jar)}, self.channel)
+        (result,) = self.channel.sent
+        return result
+
+    def test_arguments_reach_the_program_unchanged(self):
+        self.program = "import sys; print(sys.argv[1:])"
+        result = self.run_jar()
+        self.assertTrue(result['success'])
+        self.assertEqual(result['stdout'].strip(), "['a b', \"'c'\"]")
+
+    def test_timeout_stops_the_program(self):
+        self.program = "import time; time.sleep(30)"
+        started = time.time()
+        result = self.run_jar()
+        self.assertFalse(result['success'])
+        self.assertIn("timeout", result['error_message'])
+        self.assertLess(time.time() - started, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
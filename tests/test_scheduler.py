@@ -0,0 +1,153 @@
+import threading
+import time
+import unittest
+
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+
+class StubBridge:
+    """Stands in for KotlinCompilerBridge: each compile blocks until released or preempted"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = []
+        self.compiling = set()
+        self.release = {}
+        self.preempts = {}
+        # Requests that wait without a compiler process, e.g. on a shared compile
+        self.without_process = set()
+        self.diagnostics = {}
+        self.preempt_calls = []
+
+    def events(self, request_id: str):
+        with self.lock:
+            return (self.release.setdefault(request_id, threading.Event()),
+                    self.preempts.setdefault(request_id, threading.Event()))
+
+    def compile_request(self, request_id, queue_wait_time=0.0, on_diagnostic=None):
+        release, preempt = self.events(request_id)
+        with self.lock:
+            self.started.append(request_id)
+            self.compiling.add(request_id)
+        try:
+            for diagnostic in self.diagnostics.get(request_id, []):
+                on_diagnostic(dict(diagnostic))
+            while not release.wait(0.01):
+                if preempt.is_set():
+                    preempt.clear()
+                    raise bridge.CompilePreempted()
+            return bridge.CompilationResult(id=request_id, success=True)
+        finally:
+            with self.lock:
+                self.compiling.discard(request_id)
+
+    def has_running_compiler(self, request_id):
+        with self.lock:
+            return request_id in self.compiling and request_id not in self.without_process
+
+    def preempt_request(self, request_id):
+        self.preempt_calls.append(request_id)
+        self.events(request_id)[1].set()
+
+    def wait_started(self, request_id, count=1):
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            with self.lock:
+                if self.started.count(request_id) >= count:
+                    return
+            time.sleep(0.01)
+        raise AssertionError(f"{request_id} did not start")
+
+
+class CompileSchedulerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stub = StubBridge()
+        self.scheduler = bridge.CompileScheduler(self.stub, workers=1)
+
+    def tearDown(self):
+        for release, _ in [self.stub.events(request_id) for request_id in list(self.stub.release)]:
+            release.set()
+        self.scheduler.shutdown()
+
+    def submit(self, request_id, priority, **kwargs):
+        return self.scheduler.submit(request_id, priority=priority, **kwargs)
+
+    def finish(self, *request_ids):
+        for request_id in request_ids:
+            self.stub.wait_started(request_id)
+            self.stub.events(request_id)[0].set()
+
+    def test_queued_jobs_run_in_priority_order(self):
+        self.submit("busy", 'interactive')
+        self.stub.wait_started("busy")
+        jobs = [self.submit("check", 'background'), self.submit("run", 'run'),
+                self.submit("compile", 'interactive')]
+        self.finish("busy", "compile", "run", "check")
+        for job in jobs:
+            self.assertIsNotNone(job.wait(5))
+        self.assertEqual(self.stub.started, ["busy", "compile", "run", "check"])
+
+    def test_waiting_jobs_age_into_a_higher_priority(self):
+        self.submit("busy", 'interactive')
+        self.stub.wait_started("busy")
+        old = self.submit("old-check", 'background')
+        old.enqueued_at -= 3 * self.scheduler.AGING_SECONDS
+        self.submit("compile", 'interactive')
+        self.finish("busy", "old-check", "compile")
+        self.assertEqual(self.stub.started, ["busy", "old-check", "compile"])
+
+    def test_running_background_job_is_preempted_and_retried(self):
+        check = self.submit("check", 'background')
+        self.stub.wait_started("check")
+        self.submit("compile", 'interactive')
+        self.finish("compile", "check")
+        self.assertIsNotNone(check.wait(5))
+        self.assertEqual(self.stub.started, ["check", "compile", "check"])
+        self.assertEqual(self.scheduler.stats()['preempted'], 1)
+
+    def test_job_without_a_compiler_process_is_not_preempted(self):
+        self.stub.without_process.add("check")
+        self.submit("check", 'background')
+        self.stub.wait_started("check")
+        self.submit("compile", 'interactive')
+        self.assertEqual(self.stub.preempt_calls, [])
+        self.assertEqual([job.request_id for job in self.scheduler.active], ["check"])
+        self.finish("check", "compile")
+
+    def test_interactive_jobs_are_never_preempted(self):
+        self.submit("first", 'interactive')
+        self.stub.wait_started("first")
+        self.submit("second", 'interactive')
+        self.assertEqual(self.stub.preempt_calls, [])
+        self.finish("first", "second")
+
+    def test_preemptions_are_capped(self):
+        check = self.submit("check", 'background')
+        for index in range(self.scheduler.MAX_PREEMPTIONS + 1):
+            self.stub.wait_started("check", index + 1)
+            self.submit(f"compile-{index}", 'interactive')
+            if index < self.scheduler.MAX_PREEMPTIONS:
+                self.finish(f"compile-{index}")
+        self.assertEqual(len(self.stub.preempt_calls), self.scheduler.MAX_PREEMPTIONS)
+        self.finish("check", f"compile-{self.scheduler.MAX_PREEMPTIONS}")
+        self.assertIsNotNone(check.wait(5))
+
+    def test_retried_job_does_not_report_diagnostics_twice(self):
+        first = {'file': 'Main.kt', 'line': 1, 'column': 1, 'severity': 'warning', 'code': None, 'message': 'a'}
+        second = dict(first, line=2)
+        reported = []
+        self.stub.diagnostics["check"] = [first]
+        check = self.submit("check", 'background', on_diagnostic=reported.append)
+        self.stub.wait_started("check")
+        self.stub.diagnostics["check"] = [first, second]
+        self.submit("compile", 'interactive')
+        self.finish("compile", "check")
+        self.assertIsNotNone(check.wait(5))
+        self.assertEqual(reported, [first, second])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import hashlib
+import unittest
+
+from helpers import load_bridge
+
+bridge = load_bridge()
+
+
+class ApplyEditsTest(unittest.TestCase):
+
+    def test_offsets_refer_to_the_original_text(self):
+        source = "fun main() {}"
+        edits = [{'start': 12, 'end': 12, 'text': ' println(1) '}, {'start': 4, 'end': 8, 'text': 'start'}]
+        self.assertEqual(bridge.apply_edits(source, edits), "fun start() { println(1) }")
+
+    def test_offsets_count_utf16_units(self):
+        # The emoji is two UTF-16 units, as in a Kotlin String
+        self.assertEqual(bridge.apply_edits("a😀bc", [{'start': 3, 'end': 4, 'text': 'X'}]), "a😀Xc")
+
+    def test_empty_edit_list(self):
+        self.assertEqual(bridge.apply_edits("abc", []), "abc")
+
+    def test_rejects_invalid_edits(self):
+        invalid = [
+            [{'start': 2, 'end': 1, 'text': ''}],
+            [{'start': 0, 'end': 4, 'text': ''}],
+            [{'start': -1, 'end': 0, 'text': ''}],
+            [{'start': 0, 'end': 2, 'text': ''}, {'start': 1, 'end': 3, 'text': ''}],
+            [{'start': '0', 'end': 1, 'text': ''}],
+            [{'start': 0, 'end': 1, 'text': None}],
+            [1],
+            ["start"],
+            {'start': 0, 'end': 1, 'text': ''},
+            "edits",
+            None,
+        ]
+        for edits in invalid:
+            with self.subTest(edits=edits):
+                with self.assertRaises(ValueError):
+                    bridge.apply_edits("abc", edits)
+
+
+class ShadowCopiesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.shadows = bridge.ShadowCopies()
+        self.shadows.store("Main.kt", 1, "val x = 1")
+
+    def test_applies_edits_to_the_matching_version(self):
+        source = "val x = 2"
+        checksum = hashlib.sha256(source.encode()).hexdigest()
+        self.assertEqual(self.shadows.apply("Main.kt", 1, [{'start': 8, 'end': 9, 'text': '2'}], checksum), source)
+        self.assertEqual(self.shadows.stats()['deltas_applied'], 1)
+
+    def test_mismatches(self):
+        cases = [
+            ("Other.kt", 1, [], None),
+            ("Main.kt", 2, [], None),
+            ("Main.kt", 1, [{'start': 20, 'end': 20, 'text': ''}], None),
+            ("Main.kt", 1, [], "0" * 64),
+            ("Main.kt", 1, [1], None),
+            ("Main.kt", 1, {'start': 0, 'end': 1, 'text': ''}, None),
+            ("Main.kt", 1, "edits", None),
+        ]
+        for filename, version, edits, checksum in cases:
+            with self.subTest(filename=filename, version=version):
+                with self.assertRaises(bridge.ShadowMismatch):
+                    self.shadows.apply(filename, version, edits, checksum)
+        self.assertEqual(self.shadows.stats()['mismatches'], len(cases))
+
+    def test_apply_does_not_replace_the_copy(self):
+        self.shadows.apply("Main.kt", 1, [{'start': 0, 'end': 3, 'text': 'var'}])
+        self.assertEqual(self.shadows.version("Main.kt"), 1)
+
+    def test_least_recently_used_files_are_dropped(self):
+        for index in range(bridge.ShadowCopies.MAX_FILES):
+            self.shadows.store(f"File{index}.kt", 1, "")
+        self.assertIsNone(self.shadows.version("Main.kt"))
+        self.assertEqual(self.shadows.stats()['files'], bridge.ShadowCopies.MAX_FILES)
+
+
+if __name__ == '__main__':
+    unittest.main()